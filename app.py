@@ -5,69 +5,465 @@ st.set_page_config(page_title="Smart Cash Flow OCR", page_icon="💰", layout="w
 
 import os
 import pandas as pd
+import numpy as np
 import json
-from ocr_process import process_single_pdf, lookup_master, POPPLER_PATH
-from excel_handler import append_to_excel
+import math
 import urllib.parse
-import base64
-from io import BytesIO
-from PIL import Image
-from pdf2image import convert_from_path
+import functools
+import asyncio
+import fitz  # PyMuPDF
 import db_manager as db
 import re
+import string
+import gc
+import tempfile
+import threading
+import time
 
 # --- Initialization ---
 db.init_db()
 
+# Rows per page in the Database Dashboard table (default and the choices offered)
+DB_PAGE_SIZE = 100
+DB_PAGE_SIZE_OPTIONS = (50, 100, 500)
+# Rows per page in the Master Data Management list
+MASTER_PAGE_SIZE = 50
+# Raw OCR text of the current batch is spilled here; files older than this were left by ended sessions
+RAW_TEXT_SPILL_DIR = os.path.join(tempfile.gettempdir(), "ocr_fin_cashflow_raw")
+RAW_TEXT_SPILL_MAX_AGE = 24 * 60 * 60
+# Shortest A/C No the edit form looks up in master data
+MIN_AC_LOOKUP_LEN = 4
+
+# Columns produced by the OCR pipeline, in display order
+RESULT_COLUMNS = ("A/C No", "Bank Name", "Company Name", "Currency", "Document Date", "Reference No", "Total Value", "Transaction", "Source File", "Page")
+# Tab 1 editor columns: the OCR columns, then the derived PDF link (rows are picked outside the editor form)
+DISPLAY_COLUMNS = RESULT_COLUMNS + ("PDF Link",)
+RESULTS_COLUMN_CONFIG = {
+    "PDF Link": st.column_config.LinkColumn("PDF Link", help="Open in new tab", validate="^file://.*", display_text="Open"),
+    "Page": st.column_config.NumberColumn(disabled=True),
+    "Source File": st.column_config.TextColumn(disabled=True),
+    "Total Value": st.column_config.NumberColumn("Total Value", help="Amount with 2 decimal places", format="accounting"),
+}
+# Master Data Management list and Database Dashboard table columns (rows are selected with the tables' own checkboxes)
+MASTER_COLUMN_CONFIG = {
+    "id": st.column_config.NumberColumn("ID", help="Record ID", width="small"),
+}
+RECORDS_COLUMN_CONFIG = {
+    **MASTER_COLUMN_CONFIG,
+    "Total Value": st.column_config.NumberColumn("Total Value", format="accounting"),
+}
+
 # --- Caching for Performance ---
 @st.cache_data(ttl=60)
 def get_cached_filter_options():
     """Cache filter options for 60 seconds."""
     return db.get_filter_options()
 
-@st.cache_data(ttl=60)
-def get_ac_master_data(master_path=None, mtime=None):
-    """Load Master data from database. Arguments are kept for compatibility but ignored."""
-    try:
-        return db.get_all_master_records()
-    except Exception as e:
-        st.error(f"Error loading Master data from DB: {e}")
-        return pd.DataFrame()
+# The Dashboard caches below take db_mtime (db.get_db_mtime()) so that a write from any process,
+# not just this one, invalidates them; the TTL only bounds how long unused entries are kept.
+@st.cache_data(ttl=300)
+def get_cached_records_summary(db_mtime, **filters):
+    """Cache (record count, total value) per filter set and database state."""
+    return db.get_records_summary(**filters)
+
+@st.cache_data(ttl=300, show_spinner=False, max_entries=32)
+def get_cached_records_page(db_mtime, limit, offset, **filters):
+    """Cache one Dashboard page of records per filter set and database state."""
+    return db.load_records(**filters, limit=limit, offset=offset)
+
+@st.cache_resource(ttl=300, show_spinner=False, max_entries=8)
+def get_cached_filtered_ids(db_mtime, **filters):
+    """
+    Cache the IDs matching a filter set (used for record navigation) per database state, as (ids, id -> position).
+    Shared rather than unpickled on every rerun; callers must not mutate them.
+    """
+    ids = db.get_filtered_ids(**filters)
+    return ids, {record_id: pos for pos, record_id in enumerate(ids)}
+
+def clear_record_caches():
+    """Invalidate every cached view of the transactions table after a write."""
+    get_cached_filter_options.clear()
+    get_cached_records_summary.clear()
+    get_cached_records_page.clear()
+    get_cached_filtered_ids.clear()
+
+def reset_db_page():
+    """Return the Dashboard table to its first page, e.g. after the page size changes."""
+    st.session_state.db_page = 1
+
+@st.cache_resource
+def master_data_store():
+    """
+    Shared holder for the master table as {"entry": (version, df)}; edits patch it instead of re-reading.
+    Every session uses it, so "lock" guards each read-modify-write of the entry.
+    """
+    return {"entry": None, "lock": threading.Lock()}
+
+def load_ac_master_data(master_version):
+    """
+    Load Master data from database, only when master_version differs from the stored copy.
+    The frame is shared, not copied; callers must not mutate it.
+    """
+    store = master_data_store()
+    with store["lock"]:
+        entry = store["entry"]
+        if entry is None or entry[0] != master_version:
+            try:
+                entry = (master_version, db.get_all_master_records())
+            except Exception as e:
+                st.error(f"Error loading Master data from DB: {e}")
+                return pd.DataFrame()
+            store["entry"] = entry
+    return entry[1]
+
+def patch_ac_master_data(version_before, changes, upserted=None, deleted_ids=None):
+    """
+    Apply a single add/edit (upserted record dict) or delete (ids) to the stored master table,
+    then tag it with the new table version so the next rerun skips the full reload.
+    version_before is db.get_master_version() read before the write, and changes the number of rows it touched.
+    The patch only applies if the stored frame was current before the write and nothing else was written
+    alongside it; otherwise the entry is dropped and the next read reloads the table.
+    """
+    store = master_data_store()
+    with store["lock"]:
+        entry = store["entry"]
+        if entry is None:
+            return
+        version_after = version_before + changes
+        if entry[0] != version_before or db.get_master_version() != version_after or not (upserted or deleted_ids):
+            store["entry"] = None
+            return
+        df = entry[1]
+        if deleted_ids:
+            df = df[~df["id"].isin(deleted_ids)]
+        if upserted:
+            df = df[df["id"] != upserted["id"]]
+            # Insert at the row's sorted (BankName, ACNO) position; the rest of the frame is already in that order
+            bank, ac_no = upserted["BankName"], upserted["ACNO"]
+            pos = int(((df["BankName"] < bank) | ((df["BankName"] == bank) & (df["ACNO"] < ac_no))).sum())
+            df = pd.concat([df.iloc[:pos], pd.DataFrame([upserted]), df.iloc[pos:]])
+        store["entry"] = (version_after, df.reset_index(drop=True))
+
+def get_ac_master_data():
+    """Master data, re-read only when the ac_master table changes (including edits made outside the app)."""
+    return load_ac_master_data(db.get_master_version())
+
+# Columns shown in the master list editor (timestamp stays server-side)
+MASTER_VIEW_COLUMNS = ["id", "ACNO", "BankName", "Branch", "Branch NicName", "AccountName", "AccountType", "Currency"]
+
+# Lowercases A-Z only, mirroring SQLite LIKE's case folding
+ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+@st.cache_data(max_entries=16)
+def search_master_data(master_version, term):
+    """Master rows matching the search box. master_version only keys the cache."""
+    return db.search_master_records(term)
+
+@st.cache_resource(max_entries=4)
+def load_master_ui(master_version):
+    """
+    Account selectbox labels, built once per master version and shared by every tab and session.
+    Returns (labels, label_to_acno, acno_to_label); callers must not mutate them.
+    """
+    master_df = load_ac_master_data(master_version)
+    if master_df.empty:
+        return [], {}, {}
+    labels = master_display_labels(master_df).tolist()
+    ac_nos = master_df['ACNO'].tolist()
+    return labels, dict(zip(labels, ac_nos)), dict(zip(ac_nos, labels))
+
+def get_master_ui():
+    """Selectbox labels for the current master table (see load_master_ui)."""
+    return load_master_ui(db.get_master_version())
+
+# First entry of the Manual Entry and Report account selectboxes
+ACCOUNT_PLACEHOLDER = "-- Select Account --"
+
+@st.cache_resource(max_entries=4)
+def load_account_options(master_version):
+    """
+    Account selectbox options (placeholder first, then load_master_ui's labels) and label -> master record,
+    built once per master version; callers must not mutate them. A/C Nos listed twice resolve to their first row.
+    """
+    master_df = load_ac_master_data(master_version)
+    labels, label_to_acno, _ = load_master_ui(master_version)
+    first_rows = master_df.drop_duplicates("ACNO") if not master_df.empty else master_df
+    by_acno = dict(zip(first_rows["ACNO"], first_rows.to_dict("records"))) if not first_rows.empty else {}
+    return [ACCOUNT_PLACEHOLDER] + labels, {label: by_acno[ac] for label, ac in label_to_acno.items()}
+
+def get_account_options():
+    """Account selectbox options for the current master table (see load_account_options)."""
+    return load_account_options(db.get_master_version())
+
+@st.cache_resource(max_entries=4)
+def load_master_index(master_version):
+    """Master records keyed by id, built once per master version; callers must not mutate them."""
+    master_df = load_ac_master_data(master_version)
+    if master_df.empty:
+        return {}
+    return master_df.set_index("id", drop=False).to_dict("index")
+
+def get_master_record(record_id):
+    """Single master record by id from the cached index (None if it no longer exists)."""
+    return load_master_index(db.get_master_version()).get(record_id)
+
+PREVIEW_DPI = 100
+# Larger PDFs are linked rather than loaded into memory when the preview fails
+PREVIEW_FALLBACK_MAX_BYTES = 20 * 1024 * 1024
+def preview_render_lock():
+    """
+    PyMuPDF is not thread-safe; previews, background prefetch and the OCR runs take turns on
+    ocr_process.FITZ_LOCK. An imported module lives for the whole process, unlike this script's globals.
+    """
+    import ocr_process
+    return ocr_process.FITZ_LOCK
+
+@st.cache_data(ttl=600, max_entries=64, show_spinner=False)
+def rasterize_pdf_page(file_path, mtime, page_num, dpi=PREVIEW_DPI):
+    """Render one PDF page to PNG bytes, returned with the page actually rendered.
+    Out-of-range page numbers are clamped to the document. mtime and dpi are part of the cache key so edited files re-render."""
+    # PyMuPDF renders in-process (no Poppler subprocess per call)
+    with preview_render_lock(), fitz.open(file_path) as doc:
+        if doc.page_count == 0:
+            return None, page_num
+        page_num = min(max(page_num, 1), doc.page_count)
+        return doc.load_page(page_num - 1).get_pixmap(dpi=dpi).tobytes("png"), page_num
+
+@st.cache_data(max_entries=2, show_spinner=False)
+def load_app_config(mtime=None):
+    """Parse config.json once per mtime; returns {} if missing or invalid. Each caller gets its own copy."""
+    if os.path.exists("config.json"):
+        try:
+            with open("config.json", "r") as f:
+                return json.load(f)
+        except Exception:
+            pass
+    return {}
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def list_source_pdfs(source_path, dir_mtime):
+    """List PDF file names in source_path, sorted. dir_mtime keys the cache: adding, removing or renaming a file changes it."""
+    with os.scandir(source_path) as entries:
+        # Check the name first so non-PDFs never need an is_file() stat
+        files = [e.name for e in entries if e.name.lower().endswith(".pdf") and e.is_file()]
+    files.sort()
+    return files
 
 # --- Helper Functions ---
+def master_display_labels(master_df):
+    """Build the "ACNO - Bank - Account NicName" selectbox labels for every master row at once."""
+    # fillna + astype(str) converts whole columns (map(str) calls str per cell) and keeps blanks out of the labels
+    def text(col):
+        return master_df[col].fillna("").astype(str) if col in master_df.columns else ""
+    labels = text('ACNO') + " - " + text('BankName') + " - " + text('AccountName') + " " + text('Branch NicName')
+    return labels.str.strip()
+
+@functools.lru_cache(maxsize=4096)
+def quote_file_path(file_path):
+    """Percent-encode a local path for a file:/// link. File names repeat across reruns, so results are memoized."""
+    return urllib.parse.quote(file_path.replace("\\", "/"))
+
+def make_pdf_links(df, source_path):
+    """Build file:/// links for every row at once (Source File + Page). Page must already be filled and integer."""
+    source_files = df["Source File"].fillna("").map(str)
+    pages = df["Page"].astype(str)
+    # Many rows share a file, so quote each distinct path once
+    folder = os.path.join(source_path, "")
+    quoted = {f: quote_file_path(folder + f) for f in source_files.unique()}
+    return "file:///" + source_files.map(quoted) + "#page=" + pages
+
+def build_display_df(current_results, source_path):
+    """Tab 1 editor frame: fixed column order, numeric Total Value, PDF links."""
+    # One reindex adds any missing columns and fixes the order
+    display_df = pd.DataFrame(current_results).reindex(columns=DISPLAY_COLUMNS)
+    
+    # Keep numeric; the editor column formats it with separators and 2 decimals.
+    # coerce already turns blanks into NaN, so each column is converted in a single pass
+    display_df["Total Value"] = pd.to_numeric(display_df["Total Value"], errors='coerce')
+    
+    display_df["Page"] = display_df["Page"].fillna(1).astype("int32")
+    display_df["PDF Link"] = make_pdf_links(display_df, source_path)
+    return display_df
+
+def get_display_df(source_path):
+    """
+    build_display_df for this session's results, rebuilt only when they change.
+    Every change to current_results bumps editor_version, so (editor_version, source_path)
+    identifies the frame without hashing all the records on each rerun.
+    """
+    key = (st.session_state.get("editor_version", 0), source_path)
+    cached = st.session_state.get("display_df_cache")
+    if cached is None or cached[0] != key:
+        cached = (key, build_display_df(st.session_state.current_results, source_path))
+        st.session_state.display_df_cache = cached
+    return cached[1]
+
+def result_row_label(idx, rec):
+    """Row picker label for one OCR result: position, A/C No, source file and page."""
+    return f"{idx + 1}. {rec.get('A/C No') or '-'} · {rec.get('Source File')} p.{rec.get('Page') or 1}"
+
+def sync_selected_results(picker_key):
+    """Row picker on_change: mirror the picked positions into selected_results (last picked is previewed)."""
+    st.session_state.selected_results = list(st.session_state[picker_key])
+
+def prefetch_preview_pages(page_cache, results, source_path):
+    """
+    Render result pages that have no OCR raster yet (text-layer or OCR-cache files) on a background thread,
+    straight into page_cache, so the preview doesn't rasterize them on the script thread.
+    """
+    missing = {}
+    for res in results:
+        file_path = os.path.join(source_path, str(res.get("Source File")))
+        page_num = int(res.get("Page") or 1)
+        if page_num not in page_cache.setdefault(file_path, {}):
+            missing.setdefault(file_path, set()).add(page_num)
+    if not missing:
+        return
+
+    lock = preview_render_lock()
+
+    def render_missing():
+        for file_path, page_nums in missing.items():
+            doc = None
+            try:
+                with lock:
+                    doc = fitz.open(file_path)
+                    page_count = doc.page_count
+                for page_num in sorted(p for p in page_nums if 1 <= p <= page_count):
+                    # The lock is held per page, so previews in other sessions wait for one page at most;
+                    # skip pages that appeared in the meantime
+                    if page_num in page_cache[file_path]:
+                        continue
+                    with lock:
+                        png = doc.load_page(page_num - 1).get_pixmap(dpi=PREVIEW_DPI).tobytes("png")
+                    page_cache[file_path][page_num] = png
+            except Exception:
+                pass  # render_pdf falls back to rasterizing on demand
+            finally:
+                if doc is not None:
+                    with lock:
+                        doc.close()
+
+    threading.Thread(target=render_missing, daemon=True).start()
+
+def prime_edit_state(idx, rec):
+    """Load one OCR result into the Tab 1 edit form's widget state (keys edit_<field>_<idx>)."""
+    try:
+        doc_date = pd.to_datetime(rec.get("Document Date")) if rec.get("Document Date") else pd.Timestamp.now()
+    except (ValueError, TypeError):
+        doc_date = pd.Timestamp.now()
+    try:
+        total = float(rec.get("Total Value") or 0.0)
+    except (ValueError, TypeError):
+        total = 0.0
+    st.session_state[f"edit_ac_{idx}"] = rec.get("A/C No", "")
+    st.session_state[f"edit_bank_{idx}"] = rec.get("Bank Name", "")
+    st.session_state[f"edit_comp_{idx}"] = rec.get("Company Name", "")
+    st.session_state[f"edit_curr_{idx}"] = rec.get("Currency", "")
+    st.session_state[f"edit_date_{idx}"] = doc_date
+    st.session_state[f"edit_ref_{idx}"] = rec.get("Reference No", "")
+    st.session_state[f"edit_total_{idx}"] = total
+    st.session_state[f"edit_trans_{idx}"] = rec.get("Transaction", "DEBIT")
+
+# Dashboard edit form widget keys, plus the ID of the record they were loaded from
+DB_EDIT_STATE_KEYS = ("db_edit_ac", "db_edit_bank", "db_edit_comp", "db_edit_curr", "db_edit_date",
+                      "db_edit_ref", "db_edit_total", "db_edit_trans", "db_edit_primed_id")
+
+def prime_db_edit_state(record_id, rec):
+    """Load one database record into the Dashboard edit form's widget state; blank Bank/Company/Currency come from master data."""
+    ac_no = rec.get("A/C No", "")
+    details = {key: rec.get(key) for key in ("Bank Name", "Company Name", "Currency")}
+    details = {key: "" if not value or value == "None" else value for key, value in details.items()}
+    if ac_no and not all(details.values()):
+        l_bank, l_comp, l_curr, _ = db.lookup_master_info(ac_no)
+        if l_bank:
+            found = {"Bank Name": l_bank, "Company Name": l_comp, "Currency": l_curr}
+            details = {key: value or found[key] or "" for key, value in details.items()}
+            st.toast(f"✅ Auto-lookup found: {details['Bank Name']}", icon="🔍")
+    try:
+        doc_date = pd.to_datetime(rec.get("Document Date")) if rec.get("Document Date") else pd.Timestamp.now()
+    except (ValueError, TypeError):
+        doc_date = pd.Timestamp.now()
+    total = float(rec.get("Total Value") or 0.0)
+    st.session_state.db_edit_ac = ac_no
+    st.session_state.db_edit_bank = details["Bank Name"]
+    st.session_state.db_edit_comp = details["Company Name"]
+    st.session_state.db_edit_curr = details["Currency"]
+    st.session_state.db_edit_date = doc_date
+    st.session_state.db_edit_ref = rec.get("Reference No", "")
+    st.session_state.db_edit_total = f"{total:,.2f}"
+    st.session_state.db_edit_trans = rec.get("Transaction", "DEBIT")
+    st.session_state.db_edit_primed_id = record_id
+
+def release_ocr_results():
+    """Drop the OCR batch from session state (and its raw-text spill file) once it has been saved."""
+    raw_text_path = st.session_state.pop("raw_text_path", None)
+    if raw_text_path and os.path.exists(raw_text_path):
+        os.remove(raw_text_path)
+    for key in ("current_results", "selected_results", "display_df_cache", "page_cache", "edit_mode", "edit_index"):
+        st.session_state.pop(key, None)
+    gc.collect()
+
+@st.cache_resource(ttl=3600)
+def clean_stale_raw_text_files():
+    """
+    Delete raw-text spill files that ended sessions never released (the browser was closed before Save).
+    Runs at startup and then at most hourly; only files past RAW_TEXT_SPILL_MAX_AGE go, so live batches stay.
+    """
+    os.makedirs(RAW_TEXT_SPILL_DIR, exist_ok=True)
+    cutoff = time.time() - RAW_TEXT_SPILL_MAX_AGE
+    for entry in os.scandir(RAW_TEXT_SPILL_DIR):
+        try:
+            if entry.name.startswith("ocr_raw_") and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            pass  # Already removed by another session
+
+clean_stale_raw_text_files()
+
 def render_pdf(file_path, page_num=1):
     """Render a specific page of a PDF as an image."""
     try:
-        if not os.path.exists(file_path):
-            st.error(f"File not found: {file_path}")
-            return
-
-        images = convert_from_path(file_path, first_page=page_num, last_page=page_num, poppler_path=POPPLER_PATH)
-        if images:
-            st.image(images[0], caption=f"Page {page_num} of {os.path.basename(file_path)}", use_container_width=True)
+        # Reuse the page rasterized during OCR when available (no filesystem access at all)
+        png_bytes = st.session_state.get("page_cache", {}).get(file_path, {}).get(page_num)
+        if png_bytes is None:
+            # One stat both checks the file exists and gives the mtime that keys the raster cache
+            try:
+                mtime = os.stat(file_path).st_mtime
+            except FileNotFoundError:
+                st.warning(f"File not found: {file_path}")
+                return
+            png_bytes, page_num = rasterize_pdf_page(file_path, mtime, page_num)
+        if png_bytes:
+            st.image(png_bytes, caption=f"Page {page_num} of {os.path.basename(file_path)}", use_container_width=True)
         else:
             st.error("Could not render PDF page.")
     except Exception as e:
         st.error(f"Error rendering PDF: {e}")
         try:
+            if os.path.getsize(file_path) > PREVIEW_FALLBACK_MAX_BYTES:
+                # Too big to hold in memory for a download; link to the file itself like the results table does
+                file_url = "file:///" + quote_file_path(file_path) + f"#page={page_num}"
+                st.link_button("📄 Open PDF", file_url)
+                return
+            # Hand the raw bytes to the browser instead of inlining a base64 iframe
             with open(file_path, "rb") as f:
-                base64_pdf = base64.b64encode(f.read()).decode('utf-8')
-            pdf_display = f'<iframe src="data:application/pdf;base64,{base64_pdf}#page={page_num}" width="100%" height="800" type="application/pdf"></iframe>'
-            st.markdown(pdf_display, unsafe_allow_html=True)
+                st.download_button(
+                    "📄 Open PDF",
+                    data=f.read(),
+                    file_name=os.path.basename(file_path),
+                    mime="application/pdf",
+                    key=f"pdf_fallback_{file_path}_{page_num}"
+                )
         except Exception as fallback_error:
             st.error(f"Fallback preview failed: {fallback_error}")
 
 st.title("💰 Smart Cash Flow OCR")
 st.markdown("---")
 
-# Load API Key from config.json if it exists
-config_api_key = ""
-if os.path.exists("config.json"):
-    try:
-        with open("config.json", "r") as f:
-            config_api_key = json.load(f).get("API_KEY", "")
-    except Exception:
-        pass
+# Load API Key from config.json if it exists (re-parsed only when the file changes)
+config_mtime = os.path.getmtime("config.json") if os.path.exists("config.json") else 0
+config_api_key = load_app_config(config_mtime).get("API_KEY", "")
 
 # Sidebar Configuration
 st.sidebar.header("📌 Navigation")
@@ -79,15 +475,57 @@ if app_mode == "⚙️ Master Data Management":
     
     # --- MASTER DATA MANAGEMENT FUNCTIONALITY ---
     
-    # 1. Fetch Data
-    master_df = db.get_connection().execute("SELECT * FROM ac_master").fetchall() # Raw check
-    # Use pandas for easier handling
-    df_master = db.get_all_master_records()
+    # 1. Fetch Data (cached until the ac_master table changes)
+    df_master = get_ac_master_data()
     
     # --- ACTION FORMS ---
     if "master_action" not in st.session_state:
         st.session_state.master_action = None
 
+    # Button callbacks run before the script reruns, so each action needs no extra st.rerun()
+    def open_master_form(action, edit_id=None):
+        st.session_state.master_action = action
+        st.session_state.master_edit_id = edit_id
+
+    def close_master_form():
+        st.session_state.master_action = None
+        st.session_state.master_edit_id = None
+
+    def master_form_data(prefix):
+        """Add/Edit form fields (widget keys f"{prefix}_{field}") as an ac_master record dict."""
+        return {field: st.session_state.get(f"{prefix}_{field}", "") for field in MASTER_VIEW_COLUMNS[1:]}
+
+    def save_new_master_record():
+        data = master_form_data("m_new")
+        if not data["ACNO"]:
+            st.session_state.master_form_error = "A/C No is required!"
+            return
+        version_before = db.get_master_version()
+        success, msg = db.add_master_record(data)
+        if success:
+            patch_ac_master_data(version_before, 1, upserted=db.get_master_record_by_acno(str(data["ACNO"]).strip()))
+            st.toast(msg, icon="✅")
+            close_master_form()
+        else:
+            st.session_state.master_form_error = msg
+
+    def save_master_record_edit(edit_id):
+        version_before = db.get_master_version()
+        success, msg = db.update_master_record(edit_id, master_form_data("m_edit"))
+        if success:
+            patch_ac_master_data(version_before, 1, upserted=db.get_master_record_by_id(edit_id))
+            st.toast(msg, icon="✅")
+            close_master_form()
+        else:
+            st.session_state.master_form_error = msg
+
+    def delete_master_selection(ids_to_del):
+        # One transaction, IN (...) batches of db.DELETE_BATCH_SIZE ids
+        version_before = db.get_master_version()
+        count = db.delete_master_records(ids_to_del)
+        patch_ac_master_data(version_before, count, deleted_ids=ids_to_del)
+        st.toast(f"Deleted {count} records!", icon="🗑️")
+
     # --- VIEW MODE: LIST ---
     if st.session_state.master_action is None:
         # 2. Display Table
@@ -96,57 +534,65 @@ if app_mode == "⚙️ Master Data Management":
         # Search box
         search_term = st.text_input("🔍 Search Accounts", "")
         if search_term:
-            mask = df_master.astype(str).apply(lambda x: x.str.contains(search_term, case=False, na=False)).any(axis=1)
-            df_display = df_master[mask]
+            # Filtered in SQL so only matching rows are read; LIKE ignores ASCII case, so terms differing only in it share a cache entry
+            df_display = search_master_data(db.get_master_version(), search_term.translate(ASCII_LOWER))
         else:
             df_display = df_master
             
-        # Sort dataframe for better display
-        if not df_display.empty:
-            df_display = df_display.sort_values(by=["BankName", "ACNO"])
+        # Only the current page goes to the editor
+        total_master_rows = len(df_display)
+        total_master_pages = max(1, math.ceil(total_master_rows / MASTER_PAGE_SIZE))
+        master_page = min(int(st.session_state.get("master_page", 1)), total_master_pages)
+        st.session_state.master_page = master_page
+        if total_master_pages > 1:
+            st.number_input(
+                f"Page (of {total_master_pages}, {MASTER_PAGE_SIZE} rows each)",
+                min_value=1,
+                max_value=total_master_pages,
+                step=1,
+                key="master_page"
+            )
+        first_row = (master_page - 1) * MASTER_PAGE_SIZE
+        df_display = df_display.iloc[first_row:first_row + MASTER_PAGE_SIZE]
+        if len(df_display):
+            st.caption(f"Showing rows {first_row + 1:,}–{first_row + len(df_display):,} of {total_master_rows:,}")
             
-        # Add Select column if not exists
-        if "Select" not in df_display.columns:
-            df_display.insert(0, "Select", False)
+        # Rows already come back ordered by BankName, ACNO from the database.
+        # Only the shown columns; nothing is written to the frame, so the shared master frame stays untouched.
+        df_display = df_display.reindex(columns=MASTER_VIEW_COLUMNS)
             
-        # Edit/Delete UI
-        edited_master_df = st.data_editor(
+        # Edit/Delete UI: read-only table with client-side row checkboxes, only the selected positions come back.
+        # Selections belong to the rows they were made on, so the key follows the page's record IDs.
+        table_event = st.dataframe(
             df_display,
-            column_config={
-                "Select": st.column_config.CheckboxColumn("✅", help="Select record", width="small"),
-                "id": st.column_config.NumberColumn("ID", help="Record ID", disabled=True, width="small"),
-            },
+            column_config=MASTER_COLUMN_CONFIG,
             use_container_width=True,
             hide_index=True,
-            key="master_editor",
-            disabled=["id", "ACNO", "BankName", "Branch", "Branch NicName", "AccountName", "AccountType", "Currency", "timestamp"] # Make data read-only in table
+            on_select="rerun",
+            selection_mode="multi-row",
+            key=f"master_table_{hash(tuple(df_display['id'].tolist()))}"
         )
         
         # Get selected records
-        selected_master = edited_master_df[edited_master_df["Select"] == True]
+        selected_master = df_display.iloc[[r for r in table_event.selection.rows if r < len(df_display)]]
         
         # Action Buttons
         col_mb1, col_mb2, col_mb3 = st.columns([1, 1, 4])
         
         with col_mb1:
-            if st.button("✏️ Edit Record", disabled=len(selected_master) != 1, use_container_width=True):
-                rec_id = int(selected_master.iloc[0]["id"])
-                st.session_state.master_edit_id = rec_id
-                st.session_state.master_action = "edit"
-                st.rerun()
+            st.button(
+                "✏️ Edit Record", disabled=len(selected_master) != 1, use_container_width=True,
+                on_click=open_master_form, args=("edit", int(selected_master.iloc[0]["id"]) if len(selected_master) == 1 else None)
+            )
                 
         with col_mb2:
-            if st.button("🗑️ Delete", disabled=len(selected_master) == 0, type="primary", use_container_width=True):
-                ids_to_del = selected_master["id"].tolist()
-                count = db.delete_master_records(ids_to_del)
-                st.success(f"Deleted {count} records!")
-                get_ac_master_data.clear()
-                st.rerun()
+            st.button(
+                "🗑️ Delete", disabled=len(selected_master) == 0, type="primary", use_container_width=True,
+                on_click=delete_master_selection, args=(selected_master["id"].tolist(),)
+            )
                 
         with col_mb3:
-            if st.button("➕ Add New Record", use_container_width=False):
-                st.session_state.master_action = "add"
-                st.rerun()
+            st.button("➕ Add New Record", use_container_width=False, on_click=open_master_form, args=("add",))
 
     # --- ADD MODE ---
     elif st.session_state.master_action == "add":
@@ -155,54 +601,33 @@ if app_mode == "⚙️ Master Data Management":
         with st.form("add_master_form"):
             c1, c2 = st.columns(2)
             with c1:
-                new_ac = st.text_input("A/C No (Required)")
-                new_bank = st.text_input("Bank Name")
-                new_branch = st.text_input("Branch")
-                new_nic = st.text_input("Branch NicName")
+                st.text_input("A/C No (Required)", key="m_new_ACNO")
+                st.text_input("Bank Name", key="m_new_BankName")
+                st.text_input("Branch", key="m_new_Branch")
+                st.text_input("Branch NicName", key="m_new_Branch NicName")
             with c2:
-                new_name = st.text_input("Account Name")
-                new_type = st.text_input("Account Type")
-                new_curr = st.text_input("Currency")
+                st.text_input("Account Name", key="m_new_AccountName")
+                st.text_input("Account Type", key="m_new_AccountType")
+                st.text_input("Currency", key="m_new_Currency")
             
             col_save, col_cancel = st.columns([1, 1])
             with col_save:
-                submitted = st.form_submit_button("💾 Save Record", type="primary", use_container_width=True)
+                st.form_submit_button("💾 Save Record", type="primary", use_container_width=True, on_click=save_new_master_record)
             with col_cancel:
-                cancelled = st.form_submit_button("❌ Cancel", use_container_width=True)
+                st.form_submit_button("❌ Cancel", use_container_width=True, on_click=close_master_form)
                 
-            if submitted:
-                if not new_ac:
-                    st.error("A/C No is required!")
-                else:
-                    data = {
-                        "ACNO": new_ac, "BankName": new_bank, "Branch": new_branch, 
-                        "Branch NicName": new_nic, "AccountName": new_name, 
-                        "AccountType": new_type, "Currency": new_curr
-                    }
-                    success, msg = db.add_master_record(data)
-                    if success:
-                        st.success(msg)
-                        st.session_state.master_action = None
-                        get_ac_master_data.clear() # Clear cache
-                        st.rerun()
-                    else:
-                        st.error(msg)
-                        
-            if cancelled:
-                st.session_state.master_action = None
-                st.rerun()
+            if "master_form_error" in st.session_state:
+                st.error(st.session_state.pop("master_form_error"))
 
     # --- EDIT MODE ---
     elif st.session_state.master_action == "edit":
         # Check if master_edit_id exists
         if "master_edit_id" not in st.session_state or not st.session_state.master_edit_id:
              st.error("No record selected for editing.")
-             if st.button("Cancel"):
-                 st.session_state.master_action = None
-                 st.rerun()
+             st.button("Cancel", on_click=close_master_form)
         else:
             edit_id = st.session_state.master_edit_id
-            curr_rec = db.get_master_record_by_id(edit_id)
+            curr_rec = get_master_record(edit_id)
             
             if curr_rec:
                 st.subheader(f"✏️ Edit Record: {curr_rec.get('ACNO')}")
@@ -210,46 +635,32 @@ if app_mode == "⚙️ Master Data Management":
                 with st.form("edit_master_form"):
                     c1, c2 = st.columns(2)
                     with c1:
-                        e_ac = st.text_input("A/C No", value=curr_rec.get('ACNO'))
-                        e_bank = st.text_input("Bank Name", value=curr_rec.get('BankName'))
-                        e_branch = st.text_input("Branch", value=curr_rec.get('Branch'))
-                        e_nic = st.text_input("Branch NicName", value=curr_rec.get('Branch NicName'))
+                        st.text_input("A/C No", value=curr_rec.get('ACNO'), key="m_edit_ACNO")
+                        st.text_input("Bank Name", value=curr_rec.get('BankName'), key="m_edit_BankName")
+                        st.text_input("Branch", value=curr_rec.get('Branch'), key="m_edit_Branch")
+                        st.text_input("Branch NicName", value=curr_rec.get('Branch NicName'), key="m_edit_Branch NicName")
                     with c2:
-                        e_name = st.text_input("Account Name", value=curr_rec.get('AccountName'))
-                        e_type = st.text_input("Account Type", value=curr_rec.get('AccountType'))
-                        e_curr = st.text_input("Currency", value=curr_rec.get('Currency'))
+                        st.text_input("Account Name", value=curr_rec.get('AccountName'), key="m_edit_AccountName")
+                        st.text_input("Account Type", value=curr_rec.get('AccountType'), key="m_edit_AccountType")
+                        st.text_input("Currency", value=curr_rec.get('Currency'), key="m_edit_Currency")
                     
                     col_save, col_cancel = st.columns([1, 1])
                     with col_save:
-                        submitted = st.form_submit_button("💾 Update Record", type="primary", use_container_width=True)
+                        st.form_submit_button("💾 Update Record", type="primary", use_container_width=True, on_click=save_master_record_edit, args=(edit_id,))
                     with col_cancel:
-                        cancelled = st.form_submit_button("❌ Cancel", use_container_width=True)
-                        
-                    if submitted:
-                        data = {
-                            "ACNO": e_ac, "BankName": e_bank, "Branch": e_branch, 
-                            "Branch NicName": e_nic, "AccountName": e_name, 
-                            "AccountType": e_type, "Currency": e_curr
-                        }
-                        success, msg = db.update_master_record(edit_id, data)
-                        if success:
-                            st.success(msg)
-                            st.session_state.master_action = None
-                            st.session_state.master_edit_id = None
-                            get_ac_master_data.clear()
-                            st.rerun()
-                        else:
-                            st.error(msg)
+                        st.form_submit_button("❌ Cancel", use_container_width=True, on_click=close_master_form)
                     
-                    if cancelled:
-                        st.session_state.master_action = None
-                        st.session_state.master_edit_id = None
-                        st.rerun()
+                    if "master_form_error" in st.session_state:
+                        st.error(st.session_state.pop("master_form_error"))
 
 
 
     st.stop() # STOP HERE if in Master Data mode
 
+# OCR/Excel modules (Tesseract, pdf2image, aiohttp, openpyxl, xlsxwriter) are only imported once the app leaves Master Data mode
+from ocr_process import process_pdfs_pipeline, process_pdfs_typhoon_async, TYPHOON_BATCH_SIZE, TYPHOON_BATCH_MAX_WAIT_MS, TYPHOON_MAX_CONCURRENCY
+from excel_handler import append_to_excel, export_to_excel, report_to_excel_bytes
+
 # Sidebar Configuration (Original)
 st.sidebar.header("⚙️ Settings")
 source_path = st.sidebar.text_input("Source PDF Path", value=os.getcwd() + r"\source")
@@ -257,6 +668,12 @@ master_path = st.sidebar.text_input("AC Master Path", value=os.getcwd() + r"\Mas
 export_path = st.sidebar.text_input("Export Excel Path", value=os.getcwd() + r"\output\CashFlow_Report.xlsx")
 
 ocr_engine = st.sidebar.selectbox("OCR Engine", ["Tesseract", "Typhoon"])
+cpu_count = os.cpu_count() or 1
+ocr_workers = st.sidebar.slider(
+    "OCR Concurrency", min_value=1, max_value=max(cpu_count, 2), value=cpu_count,
+    help="Number of pages OCR'd in parallel with Tesseract. Each page runs in its own tesseract process, so one per core uses every core."
+)
+force_ocr = st.sidebar.checkbox("Force OCR", value=False, help="OCR every page even when the PDF already has a text layer or was OCR'd before")
 api_key = ""
 
 if ocr_engine == "Typhoon":
@@ -265,6 +682,16 @@ if ocr_engine == "Typhoon":
         st.sidebar.success("✅ API Key loaded from config.json")
     else:
         api_key = st.sidebar.text_input("Typhoon API Key", type="password")
+    typhoon_batch_size = st.sidebar.slider("Typhoon Pages per Request", min_value=1, max_value=8, value=TYPHOON_BATCH_SIZE, help="Pages sent together in one API call, from any of the selected files; 1 sends each page separately")
+    typhoon_max_wait_ms = st.sidebar.number_input(
+        "Typhoon Batch Max Wait (ms)", min_value=0, max_value=5000, value=TYPHOON_BATCH_MAX_WAIT_MS, step=50,
+        disabled=typhoon_batch_size == 1,
+        help="How long a partly filled batch waits for pages from other files before it is sent anyway"
+    )
+    typhoon_concurrency = st.sidebar.number_input(
+        "Typhoon Concurrent Requests", min_value=1, max_value=64, value=TYPHOON_MAX_CONCURRENCY, step=1,
+        help="API calls kept in flight at once across all files. Lower it if the API starts answering 429 (rate limited)."
+    )
 
 # --- Tabs Implementation ---
 tab_process, tab_db, tab_manual, tab_report, tab_balance = st.tabs(["🚀 OCR Processing", "📊 Database Dashboard", "➕ Manual Entry", "📉 Bank Statement By A/C No. Report", "💰 Bank Balance Summary"])
@@ -279,20 +706,19 @@ with tab_process:
         st.subheader("📁 Process PDFs")
         if st.button("🔍 Scan Source Folder"):
             if os.path.exists(source_path):
-                files = [f for f in os.listdir(source_path) if f.lower().endswith(".pdf")]
+                files = list_source_pdfs(source_path, os.stat(source_path).st_mtime)
                 st.session_state.pdf_files = files
                 st.success(f"Found {len(files)} PDF files.")
             else:
                 st.error("Invalid source path.")
 
         if "pdf_files" in st.session_state:
-            options = ["Select All"] + st.session_state.pdf_files
-            selected_options = st.multiselect("Select PDF(s) to process", options, default=["Select All"])
-            
-            if "Select All" in selected_options:
+            # Only send the file list to the browser when picking individual files
+            process_all = st.checkbox(f"Process all scanned files ({len(st.session_state.pdf_files)})", value=True, key="process_all_pdfs")
+            if process_all:
                 selected_files = st.session_state.pdf_files
             else:
-                selected_files = selected_options
+                selected_files = st.multiselect("Select PDF(s) to process", st.session_state.pdf_files)
             
             col_actions, col_status = st.columns([0.4, 0.6])
             with col_actions:
@@ -305,76 +731,100 @@ with tab_process:
                     st.warning("Please select at least one file to process.")
                 else:
                     all_results = []
-                    all_raw_text = ""
                     
                     files_to_process = selected_files
                     
                     progress_bar = st.progress(0)
                     status_text = st.empty()
                     
-                    for idx, file in enumerate(files_to_process):
-                        status_text.text(f"Processing {idx+1}/{len(files_to_process)}: {file}...")
-                        pdf_full_path = os.path.join(source_path, file)
-                        
-                        try:
-                            results, raw_text = process_single_pdf(
-                                pdf_full_path, 
-                                engine=ocr_engine, 
-                                api_key=api_key, 
-                                master_path=master_path
-                            )
-                            for res in results:
-                                res["Source File"] = file
-                                
-                            all_results.extend(results)
-                            all_raw_text += f"=== File: {file} ===\n{raw_text}\n\n"
-                        except Exception as e:
-                            st.error(f"Error processing {file}: {e}")
-                        
-                        progress_bar.progress((idx + 1) / len(files_to_process))
+                    file_outputs = {}
+                    finished_files = []
+                    
+                    def on_file_done(file, outcome):
+                        finished_files.append(file)
+                        status_text.text(f"Processed {len(finished_files)}/{len(files_to_process)}: {file}")
+                        if isinstance(outcome, Exception):
+                            st.error(f"Error processing {file}: {outcome}")
+                        else:
+                            file_outputs[file] = outcome
+                        progress_bar.progress(len(finished_files) / len(files_to_process))
+                    
+                    if ocr_engine == "Typhoon" and api_key:
+                        # Network-bound: send batches of pages from every file concurrently over one session
+                        path_to_file = {os.path.join(source_path, f): f for f in files_to_process}
+                        asyncio.run(process_pdfs_typhoon_async(
+                            list(path_to_file),
+                            api_key,
+                            master_path=master_path,
+                            max_concurrency=int(typhoon_concurrency),
+                            batch_size=int(typhoon_batch_size),
+                            max_wait_ms=int(typhoon_max_wait_ms),
+                            on_done=lambda path, outcome: on_file_done(path_to_file[path], outcome),
+                            force_ocr=force_ocr
+                        ))
+                    else:
+                        # Tesseract (and Typhoon without a key, as before): render, OCR and parse overlap across pages and files
+                        path_to_file = {os.path.join(source_path, f): f for f in files_to_process}
+                        process_pdfs_pipeline(
+                            list(path_to_file),
+                            engine=ocr_engine,
+                            api_key=api_key,
+                            master_path=master_path,
+                            workers=int(ocr_workers),
+                            on_done=lambda path, outcome: on_file_done(path_to_file[path], outcome),
+                            force_ocr=force_ocr
+                        )
+                    
+                    # Keep results in the same order as the selected files.
+                    # Raw text is spilled to a temp file so it doesn't sit in session memory.
+                    # Releasing the previous batch also resets edit mode for this fresh run.
+                    release_ocr_results()
+                    page_cache = {}
+                    source_counts = {"embedded": 0, "cache": 0, "ocr": 0}
+                    os.makedirs(RAW_TEXT_SPILL_DIR, exist_ok=True)
+                    raw_text_file = tempfile.NamedTemporaryFile(
+                        "w", encoding="utf-8", suffix=".txt", prefix="ocr_raw_", dir=RAW_TEXT_SPILL_DIR, delete=False
+                    )
+                    for file in files_to_process:
+                        if file not in file_outputs:
+                            continue
+                        results, raw_text, page_images, text_source = file_outputs[file]
+                        source_counts[text_source] += 1
+                        page_cache[os.path.join(source_path, file)] = page_images
+                        for res in results:
+                            res["Source File"] = file
+                            
+                        all_results.extend(results)
+                        # Written piecewise so each file's text isn't copied into a combined string first
+                        raw_text_file.writelines((f"=== File: {file} ===\n", raw_text, "\n\n"))
+                    raw_text_file.close()
                     
                     st.session_state.current_results = all_results
-                    st.session_state.raw_text = all_raw_text
-                    # Initialize edit mode state if fresh run
-                    if "edit_mode" in st.session_state:
-                        del st.session_state.edit_mode
-                    if "edit_index" in st.session_state:
-                         del st.session_state.edit_index
+                    st.session_state.editor_version = st.session_state.get("editor_version", 0) + 1
+                    st.session_state.raw_text_path = raw_text_file.name
+                    # Pages rendered during OCR, reused by the PDF preview; the rest are filled in the background
+                    st.session_state.page_cache = page_cache
+                    prefetch_preview_pages(page_cache, all_results, source_path)
                          
                     status_text.text("OCR Completed!")
-                    st.success(f"Processed {len(files_to_process)} file(s).")
+                    st.success(
+                        f"Processed {len(files_to_process)} file(s): "
+                        f"{source_counts['embedded']} born-digital, {source_counts['cache']} from OCR cache, {source_counts['ocr']} OCR'd."
+                    )
 
     with col2:
         st.subheader("📄 Raw Text Preview")
-        if "raw_text" in st.session_state:
+        raw_text_path = st.session_state.get("raw_text_path")
+        if raw_text_path and os.path.exists(raw_text_path):
             # Use expander for long text (Best Practice #6)
             with st.expander("View Raw OCR Output", expanded=False):
-                st.text_area("OCR Output", st.session_state.raw_text, height=300)
+                with open(raw_text_path, encoding="utf-8") as f:
+                    st.text_area("OCR Output", f.read(), height=300)
 
     st.markdown("---")
     st.subheader("📊 Data Validation & Export")
 
     if "current_results" in st.session_state and st.session_state.current_results:
-        display_df = pd.DataFrame(st.session_state.current_results)
-        display_df = display_df.reset_index(drop=True)
-        # Ensure all columns exist
-        for col in ["A/C No", "Bank Name", "Company Name", "Currency", "Document Date", "Reference No", "Total Value", "Transaction", "Source File", "Page"]:
-            if col not in display_df.columns:
-                display_df[col] = None
-
-        # Reorder columns for better UX
-        cols = ["A/C No", "Bank Name", "Company Name", "Currency", "Document Date", "Reference No", "Total Value", "Transaction", "Source File", "Page"]
-        display_df = display_df[cols]
-
-        def make_pdf_link(row):
-            source_file = str(row["Source File"]) if row["Source File"] else ""
-            page_num = row["Page"] if pd.notna(row["Page"]) else 1
-            file_path = os.path.join(source_path, source_file)
-            file_url = f"file:///{urllib.parse.quote(file_path.replace('\\', '/'))}#page={page_num}"
-            return file_url
-
-        display_df["Page"] = display_df["Page"].fillna(1).astype(int)
-        
         # Initialize Edit Mode State
         if "edit_mode" not in st.session_state:
             st.session_state.edit_mode = False
@@ -386,6 +836,7 @@ with tab_process:
         # Define these variables early so they are available for PDF Preview
         target_source = None
         target_page = 1
+        export_btn = save_btn = False
 
         with col1_res:
             col_head, col_edit_btn, col_del_btn = st.columns([0.6, 0.2, 0.2])
@@ -394,14 +845,12 @@ with tab_process:
             
             # --- VIEW MODE: TABLE ---
             if not st.session_state.edit_mode:
-                if "Select" not in display_df.columns:
-                     display_df.insert(0, "Select", False)
-                     for res in st.session_state.current_results:
-                         if "Select" not in res:
-                             res["Select"] = False
+                # Picked rows are kept as a list of result positions in pick order, not as a flag on every record
+                if "selected_results" not in st.session_state:
+                    st.session_state.selected_results = []
                 
                 # Check for selected row for Edit/Delete Button availability
-                selected_indices = [i for i, r in enumerate(st.session_state.current_results) if r.get("Select", False)]
+                selected_indices = st.session_state.selected_results
                 is_selected_one = len(selected_indices) == 1
                 is_selected_any = len(selected_indices) > 0
                 
@@ -413,114 +862,107 @@ with tab_process:
                         
                         # FORCE INIT SESSION STATE FOR EDIT FORM
                         # This ensures valuable are populated even if re-entering the same record
-                        rec = st.session_state.current_results[idx]
-                        st.session_state[f"edit_ac_{idx}"] = rec.get("A/C No", "")
-                        st.session_state[f"edit_bank_{idx}"] = rec.get("Bank Name", "")
-                        st.session_state[f"edit_comp_{idx}"] = rec.get("Company Name", "")
-                        st.session_state[f"edit_curr_{idx}"] = rec.get("Currency", "")
-                        st.session_state[f"edit_date_{idx}"] = pd.to_datetime(rec.get("Document Date")) if rec.get("Document Date") else pd.Timestamp.now()
-                        st.session_state[f"edit_ref_{idx}"] = rec.get("Reference No", "")
-                        st.session_state[f"edit_total_{idx}"] = float(rec.get("Total Value", 0.0)) if rec.get("Total Value") else 0.0
-                        st.session_state[f"edit_trans_{idx}"] = rec.get("Transaction", "DEBIT")
+                        prime_edit_state(idx, st.session_state.current_results[idx])
                         
                         st.rerun()
 
                 with col_del_btn:
                     if st.button("🗑️ Delete Record", disabled=not is_selected_any, type="primary", use_container_width=True):
                          # Logic to delete selected
-                         # Filter out indices in reverse order to avoid shifting issues
-                         indices_to_delete = sorted(selected_indices, reverse=True)
-                         for idx in indices_to_delete:
-                             st.session_state.current_results.pop(idx)
+                         # Rebuild the list once instead of popping each index (every pop shifts the tail)
+                         drop = set(st.session_state.selected_results)
+                         st.session_state.current_results = [r for i, r in enumerate(st.session_state.current_results) if i not in drop]
+                         st.session_state.selected_results = []
+                         # Row positions shifted, so start the editor afresh
+                         st.session_state.editor_version = st.session_state.get("editor_version", 0) + 1
                          
-                         st.toast(f"Deleted {len(indices_to_delete)} record(s)!", icon="🗑️")
+                         st.toast(f"Deleted {len(drop)} record(s)!", icon="🗑️")
                          st.rerun()
 
-                def on_editor_change():
-                    if "data_editor" not in st.session_state:
-                        return
-                    
-                    edited_rows = st.session_state["data_editor"]["edited_rows"]
-                    new_selection_idx = None
-                    
-                    for idx, changes in edited_rows.items():
-                        if "Select" in changes and changes["Select"] is True:
-                             new_selection_idx = int(idx)
-                             break
-                    
-                    if new_selection_idx is not None:
-                        for i, res in enumerate(st.session_state.current_results):
-                            res["Select"] = (i == new_selection_idx)
-                    
-                    for idx, changes in edited_rows.items():
-                         idx = int(idx)
-                         for k, v in changes.items():
-                             if k != "Select":
-                                 st.session_state.current_results[idx][k] = v
-                
-                # Re-build display_df from current_results
-                display_df = pd.DataFrame(st.session_state.current_results)
-                display_df = display_df.reset_index(drop=True)
-                for col in ["A/C No", "Bank Name", "Company Name", "Currency", "Document Date", "Reference No", "Total Value", "Transaction", "Source File", "Page", "Select"]:
-                    if col not in display_df.columns:
-                         if col == "Select": display_df[col] = False
-                         else: display_df[col] = None
-                
-                if "Total Value" in display_df.columns:
-                    display_df["Total Value"] = pd.to_numeric(display_df["Total Value"].replace('', pd.NA), errors='coerce')
-                    display_df["Total Value"] = display_df["Total Value"].apply(
-                        lambda x: f"{x:,.2f}" if pd.notna(x) else ""
-                    )
-                
-                display_df["Page"] = display_df["Page"].fillna(1).astype(int)
-                display_df["PDF Link"] = display_df.apply(make_pdf_link, axis=1).astype(str)
-                
-                cols_order = ["Select", "A/C No", "Bank Name", "Company Name", "Currency", "Document Date", "Reference No", "Total Value", "Transaction", "Source File", "Page", "PDF Link"]
-                display_df = display_df[[c for c in cols_order if c in display_df.columns]]
-    
-                column_config = {
-                    "Select": st.column_config.CheckboxColumn("View", help="Check to view PDF", width="small"),
-                    "PDF Link": st.column_config.LinkColumn("PDF Link", help="Open in new tab", validate="^file://.*", display_text="Open"),
-                    "Page": st.column_config.NumberColumn(disabled=True),
-                    "Source File": st.column_config.TextColumn(disabled=True),
-                    "Total Value": st.column_config.TextColumn("Total Value", help="Amount with 2 decimal places"),
-                }
-                
-                edited_df = st.data_editor(
-                    display_df,
-                    column_config=column_config,
-                    num_rows="fixed",
-                    use_container_width=True,
-                    height=600,
-                    key="data_editor",
-                    hide_index=True,
-                    on_change=on_editor_change
+                # Row picking lives outside the editor form so the preview and the Edit/Delete buttons follow it live.
+                # Its key follows editor_version: labels only change when the results do, and the new picker starts from selected_results.
+                results = st.session_state.current_results
+                picker_key = f"results_picker_{st.session_state.get('editor_version', 0)}"
+                if picker_key not in st.session_state:
+                    st.session_state[picker_key] = [i for i in selected_indices if i < len(results)]
+                st.multiselect(
+                    "View / select rows",
+                    options=range(len(results)),
+                    format_func=lambda i: result_row_label(i, results[i]),
+                    key=picker_key,
+                    on_change=sync_selected_results,
+                    args=(picker_key,),
+                    placeholder="Pick rows to preview, edit or delete",
                 )
-    
-                selected_rows = edited_df[edited_df["Select"] == True]
                 
-                if not selected_rows.empty:
-                    current_row = selected_rows.iloc[-1]
-                    target_source = current_row["Source File"]
-                    target_page_raw = current_row["Page"]
+                if selected_indices:
+                    current_row = results[selected_indices[-1]]
+                    target_source = current_row.get("Source File")
                     try:
-                        target_page = int(target_page_raw) if pd.notna(target_page_raw) else 1
-                    except:
+                        target_page = int(current_row.get("Page") or 1)
+                    except (TypeError, ValueError):
                         target_page = 1
-                        
-                # Master Lookup Logic for Inline Edits
-                for index, row in edited_df.iterrows():
-                    ac_no = str(row.get("A/C No", "")).strip()
-                    bank_name = str(row.get("Bank Name", "")).strip()
-                    comp_name = str(row.get("Company Name", "")).strip()
-                    currency = str(row.get("Currency", "")).strip()
+                
+                # Reruns that don't change current_results reuse the session's cached frame
+                display_df = get_display_df(source_path)
+    
+                # Edits are batched in a form (Best Practice #5): nothing reruns until a button is pressed.
+                # The key changes after each apply so the editor restarts from the updated results.
+                editor_key = f"data_editor_{st.session_state.get('editor_version', 0)}"
+                with st.form("results_edit_form", border=False):
+                    edited_df = st.data_editor(
+                        display_df,
+                        column_config=RESULTS_COLUMN_CONFIG,
+                        num_rows="fixed",
+                        use_container_width=True,
+                        height=600,
+                        key=editor_key,
+                        hide_index=True
+                    )
+                    col_apply, col_export, col_save = st.columns(3)
+                    with col_apply:
+                        apply_btn = st.form_submit_button("✅ Apply Edits", use_container_width=True)
+                    with col_export:
+                        export_btn = st.form_submit_button("💾 Export & Append to Excel", use_container_width=True)
+                    with col_save:
+                        save_btn = st.form_submit_button("🗄️ Save to Database", use_container_width=True)
+    
+                if apply_btn or export_btn or save_btn:
+                    edited_rows = st.session_state[editor_key]["edited_rows"]
+                    
+                    for i, changes in edited_rows.items():
+                        for k, v in changes.items():
+                            results[int(i)][k] = v
                     
-                    if ac_no and (not bank_name or not comp_name or not currency):
-                         match_bank, match_comp, match_curr = lookup_master(ac_no, master_path)
-                         if match_bank:
-                             if not bank_name: edited_df.at[index, "Bank Name"] = match_bank
-                             if not comp_name: edited_df.at[index, "Company Name"] = match_comp
-                             if not currency: edited_df.at[index, "Currency"] = match_curr
+                    # Master Lookup Logic for Inline Edits
+                    # Only rows with an A/C No and at least one blank field are looked up, each distinct A/C No once,
+                    # with the same partial matching as the OCR parse and the edit form (db.lookup_master_info)
+                    fill_cols = ["Bank Name", "Company Name", "Currency"]
+                    is_blank = {col: edited_df[col].fillna("").astype(str).str.strip().eq("") for col in fill_cols}
+                    ac_values = edited_df["A/C No"].fillna("").astype(str).str.strip()
+                    needs_fill = np.flatnonzero(
+                        (ac_values.ne("") & (is_blank["Bank Name"] | is_blank["Company Name"] | is_blank["Currency"])).to_numpy()
+                    )
+                    
+                    if len(needs_fill) > 0:
+                        fill_acs = ac_values.iloc[needs_fill].tolist()
+                        lookups = db.lookup_master_info_bulk(fill_acs)
+                        matched = pd.DataFrame([lookups[ac][:3] for ac in fill_acs], columns=fill_cols)
+                        for col in fill_cols:
+                            fill = is_blank[col].iloc[needs_fill].to_numpy() & matched[col].notna().to_numpy()
+                            for pos, value in zip(needs_fill[fill], matched[col].to_numpy()[fill]):
+                                results[pos][col] = value
+                            if fill.any():
+                                # Mirror the fills into the editor's frame (object dtype so a blank column can take text)
+                                edited_df[col] = edited_df[col].astype(object)
+                                edited_df.iloc[needs_fill[fill], edited_df.columns.get_loc(col)] = matched[col].to_numpy()[fill]
+                    
+                    st.session_state.editor_version = st.session_state.get("editor_version", 0) + 1
+                    # edited_df already holds the applied edits, so keep it as the next display frame
+                    # instead of rebuilding it from the records (Page and Source File are read-only, so links still hold)
+                    st.session_state.display_df_cache = ((st.session_state.editor_version, source_path), edited_df)
+                    if apply_btn:
+                        st.rerun()
             
             # --- EDIT MODE: FORM ---
             else:
@@ -548,15 +990,7 @@ with tab_process:
                         new_idx = st.session_state.edit_index
                         
                         # FORCE INIT SESSION STATE
-                        rec = st.session_state.current_results[new_idx]
-                        st.session_state[f"edit_ac_{new_idx}"] = rec.get("A/C No", "")
-                        st.session_state[f"edit_bank_{new_idx}"] = rec.get("Bank Name", "")
-                        st.session_state[f"edit_comp_{new_idx}"] = rec.get("Company Name", "")
-                        st.session_state[f"edit_curr_{new_idx}"] = rec.get("Currency", "")
-                        st.session_state[f"edit_date_{new_idx}"] = pd.to_datetime(rec.get("Document Date")) if rec.get("Document Date") else pd.Timestamp.now()
-                        st.session_state[f"edit_ref_{new_idx}"] = rec.get("Reference No", "")
-                        st.session_state[f"edit_total_{new_idx}"] = float(rec.get("Total Value", 0.0)) if rec.get("Total Value") else 0.0
-                        st.session_state[f"edit_trans_{new_idx}"] = rec.get("Transaction", "DEBIT")
+                        prime_edit_state(new_idx, st.session_state.current_results[new_idx])
                         
                         st.rerun()
                 
@@ -569,152 +1003,137 @@ with tab_process:
                         new_idx = st.session_state.edit_index
                         
                         # FORCE INIT SESSION STATE
-                        rec = st.session_state.current_results[new_idx]
-                        st.session_state[f"edit_ac_{new_idx}"] = rec.get("A/C No", "")
-                        st.session_state[f"edit_bank_{new_idx}"] = rec.get("Bank Name", "")
-                        st.session_state[f"edit_comp_{new_idx}"] = rec.get("Company Name", "")
-                        st.session_state[f"edit_curr_{new_idx}"] = rec.get("Currency", "")
-                        st.session_state[f"edit_date_{new_idx}"] = pd.to_datetime(rec.get("Document Date")) if rec.get("Document Date") else pd.Timestamp.now()
-                        st.session_state[f"edit_ref_{new_idx}"] = rec.get("Reference No", "")
-                        st.session_state[f"edit_total_{new_idx}"] = float(rec.get("Total Value", 0.0)) if rec.get("Total Value") else 0.0
-                        st.session_state[f"edit_trans_{new_idx}"] = rec.get("Transaction", "DEBIT")
+                        prime_edit_state(new_idx, st.session_state.current_results[new_idx])
                         
                         st.rerun()
 
-                # Input change callback for A/C No
-                def on_ac_edit_change():
-                    # Get the new A/C value from session state using the unique key
-                    new_ac = st.session_state.get(f"edit_ac_{idx}", "")
-                    # Lookup in DB
-                    match_bank, match_comp, match_curr, match_branch = db.lookup_master_info(new_ac)
-                    if match_bank:
-                        # Update UI Widgets ONLY
-                        # DO NOT update current_results here (wait for Save button)
-                        st.session_state[f"edit_bank_{idx}"] = match_bank
-                        st.session_state[f"edit_comp_{idx}"] = match_comp
-                        st.session_state[f"edit_curr_{idx}"] = match_curr
+                # The form runs as a fragment: A/C lookups and Save rerun only the form,
+                # not the results tab and PDF preview. Previous/Next change the preview, so they stay outside.
+                @st.fragment
+                def edit_record_form(idx, record):
+                    # Input change callback for A/C No
+                    def on_ac_edit_change():
+                        # Get the new A/C value from session state using the unique key
+                        new_ac = str(st.session_state.get(f"edit_ac_{idx}") or "").strip()
+                        # Too short to identify an account (partial matching would hit almost any row),
+                        # or the same number just looked up for this record
+                        if len(new_ac) < MIN_AC_LOOKUP_LEN or st.session_state.get(f"last_ac_query_{idx}") == new_ac:
+                            return
+                        st.session_state[f"last_ac_query_{idx}"] = new_ac
+                        # Lookup in DB (memoized per A/C No and master version)
+                        match_bank, match_comp, match_curr, match_branch = db.lookup_master_info(new_ac)
+                        if match_bank:
+                            # Update UI Widgets ONLY
+                            # DO NOT update current_results here (wait for Save button)
+                            st.session_state[f"edit_bank_{idx}"] = match_bank
+                            st.session_state[f"edit_comp_{idx}"] = match_comp
+                            st.session_state[f"edit_curr_{idx}"] = match_curr
                         
-                        st.toast(f"Match Found: {match_bank}, {match_comp}", icon="✅")
-                    else:
-                        st.toast(f"No match found for: {new_ac}", icon="⚠️")
+                            st.toast(f"Match Found: {match_bank}, {match_comp}", icon="✅")
+                        else:
+                            st.toast(f"No match found for: {new_ac}", icon="⚠️")
 
-                st.markdown("##### ✏️ Edit Details")
+                    st.markdown("##### ✏️ Edit Details")
                 
-                # Form Layout
-                e_col1, e_col2 = st.columns(2)
+                    # Edit/Previous/Next prime the form; this covers any other way into edit mode
+                    if f"edit_ac_{idx}" not in st.session_state:
+                        prime_edit_state(idx, record)
                 
-                with e_col1:
-                    # A/C No with on_change trigger
-                    st.text_input(
-                        "A/C No", 
-                        key=f"edit_ac_{idx}",
-                        on_change=on_ac_edit_change
-                    )
-                    
-                    e_bank = st.text_input("Bank Name", key=f"edit_bank_{idx}")
-                    e_comp = st.text_input("Company Name", key=f"edit_comp_{idx}")
-                    e_curr = st.text_input("Currency", key=f"edit_curr_{idx}")
+                    # Form Layout
+                    e_col1, e_col2 = st.columns(2)
                 
-                with e_col2:
-                     # Handle Date parsing safely
-                    doc_date_val = record.get("Document Date", pd.Timestamp.now())
-                    if pd.isna(doc_date_val) or doc_date_val == "":
-                         doc_date_val = pd.Timestamp.now()
-                    else:
-                         try:
-                             doc_date_val = pd.to_datetime(doc_date_val)
-                         except:
-                             doc_date_val = pd.Timestamp.now()
-
-                    e_date = st.date_input("Document Date", value=doc_date_val, key=f"edit_date_{idx}")
-                    e_ref = st.text_input("Reference No", value=record.get("Reference No", ""), key=f"edit_ref_{idx}")
+                    with e_col1:
+                        # A/C No with on_change trigger
+                        st.text_input(
+                            "A/C No", 
+                            key=f"edit_ac_{idx}",
+                            on_change=on_ac_edit_change
+                        )
                     
-                    # Handle float parsing
-                    try:
-                         val_float = float(record.get("Total Value", 0.0))
-                    except:
-                         val_float = 0.0
-                    e_total = st.number_input("Total Value", value=val_float, format="%.2f", key=f"edit_total_{idx}")
+                        e_bank = st.text_input("Bank Name", key=f"edit_bank_{idx}")
+                        e_comp = st.text_input("Company Name", key=f"edit_comp_{idx}")
+                        e_curr = st.text_input("Currency", key=f"edit_curr_{idx}")
+                
+                    with e_col2:
+                        # Date and amount were parsed once by prime_edit_state; the widgets read them from session state
+                        e_date = st.date_input("Document Date", key=f"edit_date_{idx}")
+                        e_ref = st.text_input("Reference No", key=f"edit_ref_{idx}")
+                        e_total = st.number_input("Total Value", format="%.2f", key=f"edit_total_{idx}")
                     
 <<<<<<< HEAD
-                    # BF is the 3rd option (index 2)
-                    trans_val = record.get("Transaction", "DEBIT")
-                    if trans_val == "DEBIT": target_idx = 0
-                    elif trans_val == "CREDIT": target_idx = 1
-                    else: target_idx = 2 # BF
-                    e_trans = st.selectbox("Transaction", ["DEBIT", "CREDIT", "BF"], index=target_idx, key=f"edit_trans_{idx}")
+                        # BF is the 3rd option (index 2)
+                        trans_val = record.get("Transaction", "DEBIT")
+                        if trans_val == "DEBIT": target_idx = 0
+                        elif trans_val == "CREDIT": target_idx = 1
+                        else: target_idx = 2 # BF
+                        e_trans = st.selectbox("Transaction", ["DEBIT", "CREDIT", "BF"], index=target_idx, key=f"edit_trans_{idx}")
 =======
-                    trans_options = ["DEBIT", "CREDIT", "BF"]
-                    curr_trans = record.get("Transaction", "DEBIT")
-                    target_idx = trans_options.index(curr_trans) if curr_trans in trans_options else 0
-                    e_trans = st.selectbox("Transaction", trans_options, index=target_idx, key=f"edit_trans_{idx}")
+                        trans_options = ["DEBIT", "CREDIT", "BF"]
+                        curr_trans = record.get("Transaction", "DEBIT")
+                        target_idx = trans_options.index(curr_trans) if curr_trans in trans_options else 0
+                        e_trans = st.selectbox("Transaction", trans_options, index=target_idx, key=f"edit_trans_{idx}")
 >>>>>>> 7a29223 (feat: Manual Entry improvements, BF transaction type, and Navigator filters)
                     
-                st.divider()
+                    st.divider()
                 
-                b_col1, b_col2 = st.columns([1, 1])
-                with b_col1:
-                    if st.button("💾 Save Changes", type="primary", use_container_width=True):
-                        # Update session state from widget keys
-                        st.session_state.current_results[idx]["A/C No"] = st.session_state.get(f"edit_ac_{idx}")
-                        st.session_state.current_results[idx]["Bank Name"] = st.session_state.get(f"edit_bank_{idx}")
-                        st.session_state.current_results[idx]["Company Name"] = st.session_state.get(f"edit_comp_{idx}")
-                        st.session_state.current_results[idx]["Currency"] = st.session_state.get(f"edit_curr_{idx}")
-                        st.session_state.current_results[idx]["Document Date"] = st.session_state.get(f"edit_date_{idx}").strftime("%Y-%m-%d")
-                        st.session_state.current_results[idx]["Reference No"] = st.session_state.get(f"edit_ref_{idx}")
-                        st.session_state.current_results[idx]["Total Value"] = st.session_state.get(f"edit_total_{idx}")
-                        st.session_state.current_results[idx]["Transaction"] = st.session_state.get(f"edit_trans_{idx}")
+                    b_col1, b_col2 = st.columns([1, 1])
+                    with b_col1:
+                        if st.button("💾 Save Changes", type="primary", use_container_width=True):
+                            # Update session state from widget keys
+                            st.session_state.current_results[idx]["A/C No"] = st.session_state.get(f"edit_ac_{idx}")
+                            st.session_state.current_results[idx]["Bank Name"] = st.session_state.get(f"edit_bank_{idx}")
+                            st.session_state.current_results[idx]["Company Name"] = st.session_state.get(f"edit_comp_{idx}")
+                            st.session_state.current_results[idx]["Currency"] = st.session_state.get(f"edit_curr_{idx}")
+                            st.session_state.current_results[idx]["Document Date"] = st.session_state.get(f"edit_date_{idx}").strftime("%Y-%m-%d")
+                            st.session_state.current_results[idx]["Reference No"] = st.session_state.get(f"edit_ref_{idx}")
+                            st.session_state.current_results[idx]["Total Value"] = st.session_state.get(f"edit_total_{idx}")
+                            st.session_state.current_results[idx]["Transaction"] = st.session_state.get(f"edit_trans_{idx}")
+                            st.session_state.editor_version = st.session_state.get("editor_version", 0) + 1
                         
-                        # STAY IN EDIT MODE - Refresh to show updated data
-                        st.toast(f"Record #{idx+1} updated!", icon="✅")
-                        st.rerun()
+                            # STAY IN EDIT MODE - the fragment rerun shows the updated data
+                            st.toast(f"Record #{idx+1} updated!", icon="✅")
                         
-                with b_col2:
-                    if st.button("🔙 Back to List", use_container_width=True):
-                        st.session_state.edit_mode = False
-                        st.rerun()
+                    with b_col2:
+                        if st.button("🔙 Back to List", use_container_width=True):
+                            st.session_state.edit_mode = False
+                            # Leaving edit mode changes the whole tab, not just the form
+                            st.rerun(scope="app")
+
+                edit_record_form(idx, record)
                             
         # Column 2: PDF Preview (Shared Logic)
         with col2_res:
             st.subheader("PDF Preview")
             if target_source:
-                 target_pdf_path = os.path.join(source_path, str(target_source))
-                 # Debug info if file missing
-                 if not os.path.exists(target_pdf_path):
-                     st.warning(f"File not found: {target_pdf_path}")
-                 else:
-                     render_pdf(target_pdf_path, target_page)
+                 # render_pdf warns if the file is missing
+                 render_pdf(os.path.join(source_path, str(target_source)), target_page)
             else:
-                st.info("Select a row or edit a record to preview.")
-
-        if not st.session_state.edit_mode:
-            st.divider()
-            col_btn1, col_btn2 = st.columns(2)
-            
-            with col_btn1:
-                if st.button("💾 Export & Append to Excel"):
-                    with st.spinner("Exporting to Excel..."):
-                        # Ensure we use latest data
-                        current_df = pd.DataFrame(st.session_state.current_results)
-                        cols_to_drop = [c for c in ["Select", "PDF Link"] if c in current_df.columns]
-                        export_df = current_df.drop(columns=cols_to_drop, errors='ignore')
-                        msg = append_to_excel(export_df, export_path)
-                    st.toast("Export complete!", icon="✅")
-                    st.info(msg)
-            
-            with col_btn2:
-                if st.button("🗄️ Save to Database"):
-                    with st.spinner("Saving to database..."):
-                        current_df = pd.DataFrame(st.session_state.current_results)
-                        cols_to_drop = [c for c in ["Select", "PDF Link"] if c in current_df.columns]
-                        save_df = current_df.drop(columns=cols_to_drop, errors='ignore')
-                        count, msg = db.save_records(save_df)
-                    if count > 0:
-                        st.toast(f"Saved {count} records!", icon="✅")
-                        st.success(msg)
-                        get_cached_filter_options.clear()
-                    else:
-                        st.error(msg)
+                st.info("Pick a row or edit a record to preview.")
+
+        # Export / Save were submitted with the editor form; pending edits are already applied
+        if not st.session_state.edit_mode and export_btn:
+            with st.spinner("Exporting to Excel..."):
+                current_df = pd.DataFrame(st.session_state.current_results)
+                cols_to_drop = [c for c in ["Select", "PDF Link"] if c in current_df.columns]
+                export_df = current_df.drop(columns=cols_to_drop, errors='ignore')
+                msg = append_to_excel(export_df, export_path)
+            st.toast("Export complete!", icon="✅")
+            st.info(msg)
+        
+        if not st.session_state.edit_mode and save_btn:
+            with st.spinner("Saving to database..."):
+                current_df = pd.DataFrame(st.session_state.current_results)
+                cols_to_drop = [c for c in ["Select", "PDF Link"] if c in current_df.columns]
+                save_df = current_df.drop(columns=cols_to_drop, errors='ignore')
+                count, msg = db.save_records(save_df)
+            if count > 0:
+                st.toast(f"Saved {count} records!", icon="✅")
+                st.success(msg)
+                clear_record_caches()
+                # The batch now lives in the database; free it from this session
+                release_ocr_results()
+            else:
+                st.error(msg)
     else:
         st.info("Run OCR to see data here.")
 
@@ -734,10 +1153,9 @@ with tab_db:
             # Use Master Data for formatted A/C options
             master_df_filter = get_ac_master_data()
             if not master_df_filter.empty:
-                master_df_filter['Display'] = master_df_filter.apply(lambda x: f"{x['ACNO']} - {x['BankName']} - {x['AccountName']} {x.get('Branch NicName', '')}".strip(), axis=1)
-                ac_display_list = ["All"] + master_df_filter['Display'].tolist()
-                ac_filter_map = dict(zip(master_df_filter['Display'], master_df_filter['ACNO']))
-                ac_filter_map["All"] = "All"
+                master_labels, label_to_acno, _ = get_master_ui()
+                ac_display_list = ["All"] + master_labels
+                ac_filter_map = {**label_to_acno, "All": "All"}
             else:
                 ac_display_list = ["All"] + ac_nos
                 ac_filter_map = {x: x for x in ac_display_list}
@@ -753,12 +1171,7 @@ with tab_db:
             apply_btn = False # Placeholder to be updated below
             
             # Prepare display format mapping
-            ac_display_map = {"All": "All"}
-            master_df = get_ac_master_data(master_path, os.path.getmtime(master_path) if os.path.exists(master_path) else 0)
-            if not master_df.empty:
-                for _, row in master_df.iterrows():
-                    disp = f"{row['ACNO']} - {row['BankName']} - {row['AccountName']} {row.get('Branch NicName', '')}".strip()
-                    ac_display_map[row['ACNO']] = disp
+            ac_display_map = {"All": "All", **get_master_ui()[2]}
 
             col_f1, col_f2, col_f3, col_f4 = st.columns(4)
 >>>>>>> 7a29223 (feat: Manual Entry improvements, BF transaction type, and Navigator filters)
@@ -774,15 +1187,8 @@ with tab_db:
             
             # Show selected A/C No info immediately when selected
             if f_ac_no and f_ac_no != "All":
-                # Lookup details from master data
-                ac_bank, ac_comp, ac_curr = db.lookup_master_info(f_ac_no)
-                
-                # Get Branch from master records
-                ac_branch = ""
-                if not master_df_filter.empty and "ACNO" in master_df_filter.columns:
-                    ac_match = master_df_filter[master_df_filter["ACNO"] == f_ac_no]
-                    if not ac_match.empty:
-                        ac_branch = ac_match.iloc[0].get("Branch", "")
+                # Lookup details (Branch included) from master data in one memoized call
+                ac_bank, ac_comp, ac_curr, ac_branch = db.lookup_master_info(f_ac_no)
                 
                 st.success(f"📌 **A/C No:** `{f_ac_no}` | **Bank:** `{ac_bank or 'N/A'}` | **Branch:** `{ac_branch or 'N/A'}`")
                 
@@ -839,42 +1245,40 @@ with tab_db:
         st.session_state.applied_currency = f_currency
         st.session_state.applied_start_date = f_start_date
         st.session_state.applied_end_date = f_end_date
+        st.session_state.db_page = 1
         
-    hist_df = db.load_records(
-        ac_no=st.session_state.applied_ac_no,
-        bank=st.session_state.applied_bank, 
-        company=st.session_state.applied_company,
-        currency=st.session_state.applied_currency,
-        ac_no=st.session_state.applied_ac_no,
-        start_date=st.session_state.get("applied_start_date"),
-        end_date=st.session_state.get("applied_end_date")
-    )
+    applied_filters = {
+        "ac_no": st.session_state.applied_ac_no,
+        "bank": st.session_state.applied_bank,
+        "company": st.session_state.applied_company,
+        "currency": st.session_state.applied_currency,
+        "start_date": st.session_state.get("applied_start_date"),
+        "end_date": st.session_state.get("applied_end_date")
+    }
+    
+    # Count/SUM in SQL, then load only the current page (sorted by Document Date in SQL)
+    db_mtime = db.get_db_mtime()
+    total_records, total_val = get_cached_records_summary(db_mtime, **applied_filters)
+    page_size = st.session_state.get("db_page_size", DB_PAGE_SIZE)
+    total_pages = max(1, math.ceil(total_records / page_size))
+    db_page = min(int(st.session_state.get("db_page", 1)), total_pages)
+    st.session_state.db_page = db_page
     
-    # Sort by Document Date ascending
-    if not hist_df.empty and "Document Date" in hist_df.columns:
-        hist_df = hist_df.sort_values(by="Document Date", ascending=True)
+    hist_df = get_cached_records_page(db_mtime, page_size, (db_page - 1) * page_size, **applied_filters)
     
     # Display selected A/C No info if filtered by specific account
     if st.session_state.applied_ac_no != "All":
         selected_ac = st.session_state.applied_ac_no
-        # Lookup details from master data
-        l_bank, l_comp, l_curr = db.lookup_master_info(selected_ac)
-        
-        # Get Branch from master records
-        master_df = get_ac_master_data()
-        l_branch = ""
-        if not master_df.empty and "ACNO" in master_df.columns:
-            match = master_df[master_df["ACNO"] == selected_ac]
-            if not match.empty:
-                l_branch = match.iloc[0].get("Branch", "")
+        # Lookup details (Branch included) from master data in one memoized call
+        l_bank, l_comp, l_curr, l_branch = db.lookup_master_info(selected_ac)
         
         st.info(f"**Selected Account:** A/C No: `{selected_ac}` | Bank: `{l_bank or 'N/A'}` | Branch: `{l_branch or 'N/A'}`")
     
-    # Save filtered IDs for navigation
+    # Save filtered IDs for navigation (all pages, not just the loaded one)
     if not hist_df.empty:
-        st.session_state.db_filtered_ids = hist_df["id"].tolist()
+        st.session_state.db_filtered_ids, st.session_state.db_filtered_pos = get_cached_filtered_ids(db_mtime, **applied_filters)
     else:
-        st.session_state.db_filtered_ids = []
+        st.session_state.db_filtered_ids, st.session_state.db_filtered_pos = [], {}
     
     if not hist_df.empty:
         # Initialize Edit Mode State for Database Dashboard
@@ -886,38 +1290,53 @@ with tab_db:
         # --- VIEW MODE: TABLE ---
         if not st.session_state.db_edit_mode:
             # Metrics and Controls Row
-            col_met1, col_met2, col_met3, col_met4 = st.columns([1.5, 2, 1.2, 0.3])
+            col_met1, col_met2, col_met3 = st.columns([1.5, 3.2, 0.3])
             with col_met1:
-                st.metric("Total Records", f"{len(hist_df):,}")
+                st.metric("Total Records", f"{total_records:,}")
             with col_met2:
-                total_val = hist_df["Total Value"].sum()
                 st.metric("Total Accumulated Value", f"{total_val:,.2f}")
             with col_met3:
-                st.markdown("<br>", unsafe_allow_html=True)
-                is_all_selected = st.checkbox("✅ Select All", key="sel_all_records", help="Check to select all records in the table")
-            with col_met4:
                 st.markdown("<br>", unsafe_allow_html=True)
                 if st.button("🔄", help="Refresh data from database", use_container_width=True):
+                    clear_record_caches()
                     st.rerun()
                 
-            if "Select" not in hist_df.columns:
-                hist_df.insert(0, "Select", is_all_selected)
-            else:
-                hist_df["Select"] = is_all_selected
+            col_page, col_page_size = st.columns([3, 1])
+            with col_page_size:
+                st.selectbox(
+                    "Rows per page",
+                    DB_PAGE_SIZE_OPTIONS,
+                    index=DB_PAGE_SIZE_OPTIONS.index(DB_PAGE_SIZE),
+                    key="db_page_size",
+                    on_change=reset_db_page
+                )
+            if total_pages > 1:
+                with col_page:
+                    st.number_input(
+                        f"Page (of {total_pages}, {page_size} rows each)",
+                        min_value=1,
+                        max_value=total_pages,
+                        step=1,
+                        key="db_page"
+                    )
+            first_row = (db_page - 1) * page_size + 1
+            st.caption(f"Showing rows {first_row:,}–{first_row + len(hist_df) - 1:,} of {total_records:,}")
                 
-            edited_hist_df = st.data_editor(
+            # Read-only table with client-side row checkboxes (the header box selects the whole page):
+            # only the selected positions come back, so there is no Select column to rebuild and diff.
+            # The key follows the page's record IDs, so a selection never carries over to different rows.
+            table_event = st.dataframe(
                 hist_df,
-                column_config={
-                    "Select": st.column_config.CheckboxColumn("✅", help="Select record", width="small"),
-                    "id": st.column_config.NumberColumn("ID", help="Record ID", disabled=True, width="small"),
-                },
+                column_config=RECORDS_COLUMN_CONFIG,
                 use_container_width=True,
                 hide_index=True,
-                key="db_editor"
+                on_select="rerun",
+                selection_mode="multi-row",
+                key=f"db_table_{hash(tuple(hist_df['id'].tolist()))}"
             )
             
             # Get selected records
-            selected_records = edited_hist_df[edited_hist_df["Select"] == True]
+            selected_records = hist_df.iloc[[r for r in table_event.selection.rows if r < len(hist_df)]]
             is_one_selected = len(selected_records) == 1
             is_any_selected = len(selected_records) > 0
             
@@ -926,39 +1345,10 @@ with tab_db:
             
             with col_btn1:
                 if st.button("✏️ Edit Record", disabled=not is_one_selected, use_container_width=True, key="btn_db_edit_rec"):
-                    # Get the selected record ID
-                    rec_row = selected_records.iloc[0]
-                    selected_id = rec_row["id"]
-                    
+                    # The edit form loads the record and fills its fields from it
                     st.session_state.db_edit_mode = True
-                    st.session_state.db_edit_id = selected_id
-                    
-                    # Get basic info
-                    ac_no = rec_row.get("A/C No", "")
-                    bank = rec_row.get("Bank Name", "")
-                    comp = rec_row.get("Company Name", "")
-                    curr = rec_row.get("Currency", "")
-                    
-                    # Auto-lookup if info is missing or "None"
-                    if ac_no and (not bank or bank == "None" or not comp or comp == "None" or not curr or curr == "None"):
-                        l_bank, l_comp, l_curr = db.lookup_master_info(ac_no)
-                        if l_bank:
-                            bank = l_bank if (not bank or bank == "None") else bank
-                            comp = l_comp if (not comp or comp == "None") else comp
-                            curr = l_curr if (not curr or curr == "None") else curr
-                            st.toast(f"✅ Auto-lookup found: {bank}", icon="🔍")
-
-                    # FORCE INIT SESSION STATE
-                    st.session_state.db_edit_ac = ac_no
-                    st.session_state.db_edit_bank = bank if bank and bank != "None" else ""
-                    st.session_state.db_edit_comp = comp if comp and comp != "None" else ""
-                    st.session_state.db_edit_curr = curr if curr and curr != "None" else ""
-                    st.session_state.db_edit_date = pd.to_datetime(rec_row.get("Document Date")) if rec_row.get("Document Date") \
-                                                    else pd.Timestamp.now()
-                    st.session_state.db_edit_ref = rec_row.get("Reference No", "")
-                    val = float(rec_row.get("Total Value", 0.0)) if rec_row.get("Total Value") else 0.0
-                    st.session_state.db_edit_total = f"{val:,.2f}"
-                    st.session_state.db_edit_trans = rec_row.get("Transaction", "DEBIT")
+                    st.session_state.db_edit_id = int(selected_records.iloc[0]["id"])
+                    st.session_state.pop("db_edit_primed_id", None)
                     
                     st.rerun()
             
@@ -970,7 +1360,7 @@ with tab_db:
                             ids_to_delete = selected_records["id"].tolist()
                             count = db.delete_records(ids_to_delete)
                         st.toast(f"Deleted {count} records!", icon="🗑️")
-                        get_cached_filter_options.clear()
+                        clear_record_caches()
                         st.rerun()
                 else:
                     st.button("🗑️ Delete Selected", disabled=True, use_container_width=True, key="btn_db_del_disabled")
@@ -978,10 +1368,11 @@ with tab_db:
             with col_btn3:
                 if st.button("📥 Export to Excel", use_container_width=True):
                     with st.spinner("Exporting report..."):
-                        export_hist = edited_hist_df.drop(columns=["Select"])
+                        # Export every filtered record, not just the visible page
+                        export_hist = db.load_records(**applied_filters)
                         report_name = f"DB_Report_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
                         report_path = os.path.join("output", report_name)
-                        export_hist.to_excel(report_path, index=False)
+                        export_to_excel(export_hist, report_path)
                     st.toast("Report exported!", icon="📥")
                     st.success(f"Report exported to {report_path}")
         
@@ -1003,179 +1394,138 @@ with tab_db:
                     st.rerun()
                 st.stop()
             
-            record = db.get_record_by_id(record_id)
-            
-            if record is None:
-                st.error(f"Record #{record_id} not found in database.")
-                st.warning("This may happen if the record was deleted or the session has stale data.")
-                if st.button("🔙 Back to List", key="back_from_error"):
-                    st.session_state.db_edit_mode = False
-                    st.session_state.db_edit_id = None
-                    st.rerun()
-            else:
-                # --- Navigation Logic ---
-                filtered_ids = st.session_state.get("db_filtered_ids", [])
-                current_idx = -1
-                if record_id in filtered_ids:
-                    current_idx = filtered_ids.index(record_id)
-                
-                nav_col1, nav_col2, nav_col3 = st.columns([0.2, 0.6, 0.2])
+            # The form runs as a fragment: Previous/Next and field callbacks rerun only the form,
+            # not the filters, metrics and table queries. Save and Cancel still rerun the whole app.
+            @st.fragment
+            def db_edit_form():
+                # Read the ID on every run: a fragment rerun reuses the arguments of the last full run
+                record_id = int(st.session_state.db_edit_id)
+                record = db.get_record_by_id(record_id)
+                if record is not None and st.session_state.get("db_edit_primed_id") != record_id:
+                    # First run for this record (Edit, Previous or Next): fill the form from it
+                    prime_db_edit_state(record_id, record)
                 
-                with nav_col1:
-                    if st.button("⬅️ Previous", disabled=(current_idx <= 0), key="btn_db_prev", use_container_width=True):
-                        new_id = filtered_ids[current_idx - 1]
-                        st.session_state.db_edit_id = new_id
-                        
-                        # FORCE INIT STATE FOR NEW RECORD
-                        new_rec = db.get_record_by_id(new_id)
-                        if new_rec:
-                             ac_no = new_rec.get("A/C No", "")
-                             bank = new_rec.get("Bank Name", "")
-                             comp = new_rec.get("Company Name", "")
-                             curr = new_rec.get("Currency", "")
-                             
-                             if ac_no and (not bank or bank == "None" or not comp or comp == "None" or not curr or curr == "None"):
-                                 l_bank, l_comp, l_curr = db.lookup_master_info(ac_no)
-                                 if l_bank:
-                                     bank = l_bank if (not bank or bank == "None") else bank
-                                     comp = l_comp if (not comp or comp == "None") else comp
-                                     curr = l_curr if (not curr or curr == "None") else curr
-
-                             st.session_state.db_edit_ac = ac_no
-                             st.session_state.db_edit_bank = bank if bank and bank != "None" else ""
-                             st.session_state.db_edit_comp = comp if comp and comp != "None" else ""
-                             st.session_state.db_edit_curr = curr if curr and curr != "None" else ""
-                             st.session_state.db_edit_date = pd.to_datetime(new_rec.get("Document Date")) if new_rec.get("Document Date") else pd.Timestamp.now()
-                             st.session_state.db_edit_ref = new_rec.get("Reference No", "")
-                             val = float(new_rec.get("Total Value", 0.0)) if new_rec.get("Total Value") else 0.0
-                             st.session_state.db_edit_total = f"{val:,.2f}"
-                             st.session_state.db_edit_trans = new_rec.get("Transaction", "DEBIT")
-                        
+                if record is None:
+                    st.error(f"Record #{record_id} not found in database.")
+                    st.warning("This may happen if the record was deleted or the session has stale data.")
+                    if st.button("🔙 Back to List", key="back_from_error"):
+                        st.session_state.db_edit_mode = False
+                        st.session_state.db_edit_id = None
                         st.rerun()
+                else:
+                    # --- Navigation Logic ---
+                    filtered_ids = st.session_state.get("db_filtered_ids", [])
+                    current_idx = st.session_state.get("db_filtered_pos", {}).get(record_id, -1)
+                
+                    nav_col1, nav_col2, nav_col3 = st.columns([0.2, 0.6, 0.2])
+                
+                    with nav_col1:
+                        if st.button("⬅️ Previous", disabled=(current_idx <= 0), key="btn_db_prev", use_container_width=True):
+                            new_id = filtered_ids[current_idx - 1]
+                            st.session_state.db_edit_id = new_id
+                            
+                            # Only the form shows the new record, so only the fragment reruns
+                            st.rerun(scope="fragment")
 
-                with nav_col2:
-                    st.markdown(f"<p style='text-align: center; padding-top: 10px;'><b>Record {current_idx+1} of {len(filtered_ids)} (ID: {record_id})</b></p>", unsafe_allow_html=True)
+                    with nav_col2:
+                        st.markdown(f"<p style='text-align: center; padding-top: 10px;'><b>Record {current_idx+1} of {len(filtered_ids)} (ID: {record_id})</b></p>", unsafe_allow_html=True)
 
-                with nav_col3:
-                    if st.button("Next ➡️", disabled=(current_idx >= len(filtered_ids) - 1), key="btn_db_next", use_container_width=True):
-                        new_id = filtered_ids[current_idx + 1]
-                        st.session_state.db_edit_id = new_id
-                        
-                        # FORCE INIT STATE FOR NEW RECORD
-                        new_rec = db.get_record_by_id(new_id)
-                        if new_rec:
-                             ac_no = new_rec.get("A/C No", "")
-                             bank = new_rec.get("Bank Name", "")
-                             comp = new_rec.get("Company Name", "")
-                             curr = new_rec.get("Currency", "")
-                             
-                             if ac_no and (not bank or bank == "None" or not comp or comp == "None" or not curr or curr == "None"):
-                                 l_bank, l_comp, l_curr = db.lookup_master_info(ac_no)
-                                 if l_bank:
-                                     bank = l_bank if (not bank or bank == "None") else bank
-                                     comp = l_comp if (not comp or comp == "None") else comp
-                                     curr = l_curr if (not curr or curr == "None") else curr
-
-                             st.session_state.db_edit_ac = ac_no
-                             st.session_state.db_edit_bank = bank if bank and bank != "None" else ""
-                             st.session_state.db_edit_comp = comp if comp and comp != "None" else ""
-                             st.session_state.db_edit_curr = curr if curr and curr != "None" else ""
-                             st.session_state.db_edit_date = pd.to_datetime(new_rec.get("Document Date")) if new_rec.get("Document Date") else pd.Timestamp.now()
-                             st.session_state.db_edit_ref = new_rec.get("Reference No", "")
-                             val = float(new_rec.get("Total Value", 0.0)) if new_rec.get("Total Value") else 0.0
-                             st.session_state.db_edit_total = f"{val:,.2f}"
-                             st.session_state.db_edit_trans = new_rec.get("Transaction", "DEBIT")
-                        
-                        st.rerun()
-                st.divider()
+                    with nav_col3:
+                        if st.button("Next ➡️", disabled=(current_idx >= len(filtered_ids) - 1), key="btn_db_next", use_container_width=True):
+                            new_id = filtered_ids[current_idx + 1]
+                            st.session_state.db_edit_id = new_id
+                            
+                            # Only the form shows the new record, so only the fragment reruns
+                            st.rerun(scope="fragment")
+                    st.divider()
                 
-                # define callback
-                def format_db_total_input():
-                    val = st.session_state.db_edit_total
-                    # Keep only digits and decimal point
-                    clean_val = re.sub(r"[^\d.]", "", val)
-                    try:
-                        if clean_val:
-                            formatted = f"{float(clean_val):,.2f}"
-                            st.session_state.db_edit_total = formatted
-                    except ValueError:
-                        pass
-
-                def on_db_ac_change():
-                    new_ac = st.session_state.get("db_edit_ac", "")
-                    bank, comp, curr, branch = db.lookup_master_info(new_ac)
-                    if bank:
-                        st.session_state.db_edit_bank = bank if bank and bank != "None" else ""
-                        st.session_state.db_edit_comp = comp if comp and comp != "None" else ""
-                        st.session_state.db_edit_curr = curr if curr and curr != "None" else ""
-                        st.toast(f"✅ Auto-filled details for A/C: {new_ac}")
-                    else:
-                        st.toast(f"⚠️ No master data found for A/C: {new_ac}")
+                    # define callback
+                    def format_db_total_input():
+                        val = st.session_state.db_edit_total
+                        # Keep only digits and decimal point
+                        clean_val = re.sub(r"[^\d.]", "", val)
+                        try:
+                            if clean_val:
+                                formatted = f"{float(clean_val):,.2f}"
+                                st.session_state.db_edit_total = formatted
+                        except ValueError:
+                            pass
+
+                    def on_db_ac_change():
+                        new_ac = st.session_state.get("db_edit_ac", "")
+                        bank, comp, curr, branch = db.lookup_master_info(new_ac)
+                        if bank:
+                            st.session_state.db_edit_bank = bank if bank and bank != "None" else ""
+                            st.session_state.db_edit_comp = comp if comp and comp != "None" else ""
+                            st.session_state.db_edit_curr = curr if curr and curr != "None" else ""
+                            st.toast(f"✅ Auto-filled details for A/C: {new_ac}")
+                        else:
+                            st.toast(f"⚠️ No master data found for A/C: {new_ac}")
 
-                # Use direct widgets instead of form
-                col_e1, col_e2 = st.columns(2)
+                    # Use direct widgets instead of form
+                    col_e1, col_e2 = st.columns(2)
                 
-                with col_e1:
-                    e_ac_no = st.text_input("A/C No", key="db_edit_ac", on_change=on_db_ac_change)
-                    e_bank = st.text_input("Bank Name", key="db_edit_bank")
-                    e_company = st.text_input("Company Name", key="db_edit_comp")
-                    e_currency = st.text_input("Currency", key="db_edit_curr")
+                    with col_e1:
+                        e_ac_no = st.text_input("A/C No", key="db_edit_ac", on_change=on_db_ac_change)
+                        e_bank = st.text_input("Bank Name", key="db_edit_bank")
+                        e_company = st.text_input("Company Name", key="db_edit_comp")
+                        e_currency = st.text_input("Currency", key="db_edit_curr")
                 
-                with col_e2:
-                    # Widgets using KEYS ONLY (Initialized in Edit Button)
-                    e_date = st.date_input("Document Date", key="db_edit_date")
-                    e_ref = st.text_input("Reference No", key="db_edit_ref")
-                    e_total = st.text_input("Total Value", key="db_edit_total", on_change=format_db_total_input)
+                    with col_e2:
+                        # Widgets using KEYS ONLY (Initialized in Edit Button)
+                        e_date = st.date_input("Document Date", key="db_edit_date")
+                        e_ref = st.text_input("Reference No", key="db_edit_ref")
+                        e_total = st.text_input("Total Value", key="db_edit_total", on_change=format_db_total_input)
                     
-                    e_trans = st.selectbox("Transaction", ["DEBIT", "CREDIT", "BF"], key="db_edit_trans")
+                        e_trans = st.selectbox("Transaction", ["DEBIT", "CREDIT", "BF"], key="db_edit_trans")
                 
-                st.divider()
+                    st.divider()
                 
-                # Source File (read-only)
-                st.text_input("Source File (Read-only)", value=record.get("Source File", ""), disabled=True)
+                    # Source File (read-only)
+                    st.text_input("Source File (Read-only)", value=record.get("Source File", ""), disabled=True)
                 
-                col_save, col_cancel = st.columns(2)
+                    col_save, col_cancel = st.columns(2)
                 
-                with col_save:
-                    if st.button("💾 Save Changes", type="primary", use_container_width=True):
-                        # Prepare data for update from session state keys
-                        update_data = {
-                            "ac_no": st.session_state.db_edit_ac,
-                            "bank_name": st.session_state.db_edit_bank,
-                            "company_name": st.session_state.db_edit_comp,
-                            "currency": st.session_state.db_edit_curr,
-                            "doc_date": st.session_state.db_edit_date.strftime("%Y-%m-%d"),
-                            "ref_no": st.session_state.db_edit_ref,
-                            "total_value": float(re.sub(r"[^\d.]", "", st.session_state.db_edit_total)) if st.session_state.db_edit_total else 0.0,
-                            "transaction_details": st.session_state.db_edit_trans
-                        }
+                    with col_save:
+                        if st.button("💾 Save Changes", type="primary", use_container_width=True):
+                            # Prepare data for update from session state keys
+                            update_data = {
+                                "ac_no": st.session_state.db_edit_ac,
+                                "bank_name": st.session_state.db_edit_bank,
+                                "company_name": st.session_state.db_edit_comp,
+                                "currency": st.session_state.db_edit_curr,
+                                "doc_date": st.session_state.db_edit_date.strftime("%Y-%m-%d"),
+                                "ref_no": st.session_state.db_edit_ref,
+                                "total_value": float(re.sub(r"[^\d.]", "", st.session_state.db_edit_total)) if st.session_state.db_edit_total else 0.0,
+                                "transaction_details": st.session_state.db_edit_trans
+                            }
                         
-                        success, msg = db.update_record(record_id, update_data)
+                            success, msg = db.update_record(record_id, update_data)
                         
-                        if success:
-                            st.toast(msg, icon="✅")
-                            # Clear edit state keys
-                            keys_to_clear = ["db_edit_ac", "db_edit_bank", "db_edit_comp", "db_edit_curr", "db_edit_date", "db_edit_ref", "db_edit_total", "db_edit_trans"]
-                            for k in keys_to_clear:
-                                if k in st.session_state: del st.session_state[k]
+                            if success:
+                                st.toast(msg, icon="✅")
+                                # Clear edit state keys
+                                for k in DB_EDIT_STATE_KEYS:
+                                    st.session_state.pop(k, None)
                                 
+                                st.session_state.db_edit_mode = False
+                                st.session_state.db_edit_id = None
+                                clear_record_caches()
+                                st.rerun()
+                            else:
+                                st.error(msg)
+                
+                    with col_cancel:
+                        if st.button("❌ Cancel", use_container_width=True, key="btn_db_edit_cancel"):
+                            # Clear edit state keys
+                            for k in DB_EDIT_STATE_KEYS:
+                                st.session_state.pop(k, None)
+                            
                             st.session_state.db_edit_mode = False
                             st.session_state.db_edit_id = None
-                            get_cached_filter_options.clear()
                             st.rerun()
-                        else:
-                            st.error(msg)
-                
-                with col_cancel:
-                    if st.button("❌ Cancel", use_container_width=True, key="btn_db_edit_cancel"):
-                        # Clear edit state keys
-                        keys_to_clear = ["db_edit_ac", "db_edit_bank", "db_edit_comp", "db_edit_curr", "db_edit_date", "db_edit_ref", "db_edit_total", "db_edit_trans"]
-                        for k in keys_to_clear:
-                            if k in st.session_state: del st.session_state[k]
-                            
-                        st.session_state.db_edit_mode = False
-                        st.session_state.db_edit_id = None
-                        st.rerun()
+
+            db_edit_form()
             
     else:
         st.info("No data found in database. Try saving some OCR results first.")
@@ -1188,13 +1538,11 @@ with tab_manual:
     st.info("Directly add a transaction record to the database. Fields will auto-populate based on A/C No selection.")
     
     # Load Master Data
-    master_df = get_ac_master_data(master_path, os.path.getmtime(master_path) if os.path.exists(master_path) else 0)
+    master_df = get_ac_master_data()
     
     if not master_df.empty:
-        # Create formatted options and a mapping back to the raw A/C No
-        master_df['Display'] = master_df.apply(lambda x: f"{x['ACNO']} - {x['BankName']} - {x['AccountName']} {x.get('Branch NicName', '')}".strip(), axis=1)
-        ac_display_options = ["-- Select Account --"] + master_df['Display'].tolist()
-        ac_mapping = dict(zip(master_df['Display'], master_df['ACNO']))
+        # Formatted options and the master record behind each, both cached per master version
+        ac_display_options, label_to_record = get_account_options()
         
         # UI Columns
         col_m1, col_m2 = st.columns([0.6, 0.4], gap="large")
@@ -1207,23 +1555,15 @@ with tab_manual:
         with col_m1:
             st.markdown("##### 📝 Input Details")
             selected_display = st.selectbox("A/C No (Search by No, Bank, or Name)", ac_display_options, key="manual_ac")
-            selected_ac = ac_mapping.get(selected_display, "-- Select Account --")
             
-            # Auto-lookup based on selection
-            bank_val = ""
-            comp_val = ""
-            curr_val = ""
-            acc_type_val = ""
-            branch_val = ""
-            
-            if selected_ac != "-- Select Account --":
-                match = master_df[master_df['ACNO'] == selected_ac]
-                if not match.empty:
-                    bank_val = match.iloc[0].get('BankName', '')
-                    comp_val = match.iloc[0].get('AccountName', '')
-                    curr_val = match.iloc[0].get('Currency', '')
-                    acc_type_val = match.iloc[0].get('AccountType', '')
-                    branch_val = match.iloc[0].get('Branch', '')
+            # Auto-lookup based on selection (a dict lookup, no scan of the master table)
+            match = label_to_record.get(selected_display, {})
+            selected_ac = match.get('ACNO', ACCOUNT_PLACEHOLDER)
+            bank_val = match.get('BankName', '')
+            comp_val = match.get('AccountName', '')
+            curr_val = match.get('Currency', '')
+            acc_type_val = match.get('AccountType', '')
+            branch_val = match.get('Branch', '')
             
             m_transaction = st.selectbox("Transaction Type", ["DEBIT", "CREDIT", "BF"], key="m_trans")
             m_date = st.date_input("Document Date", value=pd.Timestamp.now(), key="m_date")
@@ -1270,7 +1610,7 @@ with tab_manual:
                     st.rerun()
 
         if submit_manual:
-            if selected_ac == "-- Select Account --":
+            if selected_ac == ACCOUNT_PLACEHOLDER:
                 st.error("Please select a valid Account Number.")
             elif m_total <= 0:
                 st.warning("Total Value should be greater than 0.")
@@ -1293,7 +1633,7 @@ with tab_manual:
                 if count > 0:
                     st.success(f"Successfully saved manual record for A/C {selected_ac}")
                     st.toast("Manual record saved!", icon="✅")
-                    get_cached_filter_options.clear()
+                    clear_record_caches()
                     
                     # RESET FORM for New Record
                     st.session_state.m_ref = ""
@@ -1319,13 +1659,12 @@ with tab_report:
     # st.info("Generate a detailed bank statement with running balance.")
     
     # Reuse functionality from Manual Entry to load Master Data options
-    master_df = get_ac_master_data(master_path, os.path.getmtime(master_path) if os.path.exists(master_path) else 0)
+    master_df = get_ac_master_data()
     
     if not master_df.empty:
         # Create formatting options
-        master_df['Display'] = master_df.apply(lambda x: f"{x['ACNO']} - {x['BankName']} - {x['AccountName']} {x.get('Branch NicName', '')}".strip(), axis=1)
-        ac_display_options = ["-- Select Account --"] + master_df['Display'].tolist()
-        ac_mapping = dict(zip(master_df['Display'], master_df['ACNO']))
+        master_labels, ac_mapping, _ = get_master_ui()
+        ac_display_options, _ = get_account_options()
         
 <<<<<<< HEAD
         with st.expander("🔍 Filter & Search Options", expanded=True):
@@ -1418,75 +1757,28 @@ with tab_report:
                         end_date = f"{r_year}-{r_month}-{last_day}"
                         period_str = f"{r_year}-{r_month}"
 
-                # Load Data filtered by Account and Date Range
-                report_df = db.load_records(
-                    ac_no=r_selected_ac,
-                    start_date=start_date,
-                    end_date=end_date
-                )
-                
-                if not report_df.empty:
-                    # Data Transformation Logic
+                # Load the statement for the Account and Date Range; the BF/Debit/Credit split
+                # and the running balance are computed by SQLite in one query
 <<<<<<< HEAD
-                    # 1. Sort by Date -> BF First -> id
-                    report_df['Sort_Order'] = report_df['Transaction'].apply(lambda x: 0 if x == 'BF' else 1)
-                    report_df = report_df.sort_values(by=["Document Date", "Sort_Order", "id"], ascending=[True, True, True])
-                    
-                    # 2. Pivot/Melt Logic: Separate Total Value into Debit/Credit/BF columns
-                    report_df['Debit'] = report_df.apply(lambda x: x['Total Value'] if x['Transaction'] == 'DEBIT' else 0, axis=1)
-                    report_df['Credit'] = report_df.apply(lambda x: x['Total Value'] if x['Transaction'] == 'CREDIT' else 0, axis=1)
-                    report_df['BF'] = report_df.apply(lambda x: x['Total Value'] if x['Transaction'] == 'BF' else 0, axis=1)
-                    
-                    # 3. Calculate Running Balance
-                    # Calculate cumulative sum of (Debit - Credit + BF)
-                    # Assuming BF is a positive addition (Balance Forward)
-                    report_df['Net Change'] = report_df['Debit'] - report_df['Credit'] + report_df['BF']
+                # Sort by Date -> BF First -> id
+                final_df = db.load_statement(r_selected_ac, start_date, end_date, starting_balance)
 =======
-                    # 1. Custom Sort: BF first, then by Date and ID
-                    # Create temporary priority column: BF=0, Others=1
-                    report_df['sort_priority'] = report_df['Transaction'].apply(lambda x: 0 if x == 'BF' else 1)
-                    report_df = report_df.sort_values(by=["sort_priority", "Document Date", "id"], ascending=[True, True, True])
-                    
-                    # 2. Pivot/Melt Logic
-                    report_df['Debit'] = report_df.apply(lambda x: x['Total Value'] if x['Transaction'] == 'DEBIT' else 0, axis=1)
-                    report_df['Credit'] = report_df.apply(lambda x: x['Total Value'] if x['Transaction'] == 'CREDIT' else 0, axis=1)
-                    # New BF Column logic
-                    report_df['BF'] = report_df.apply(lambda x: x['Total Value'] if x['Transaction'] == 'BF' else 0, axis=1)
-                    
-                    # 3. Calculate Running Balance
-                    # Formula: Balance = Starting Balance + BF + Debit - Credit
-                    # Note: We accumulate the net change relative to the starting row
-                    
-                    # Calculate Net Change per row
-                    report_df['Net Change'] = report_df['BF'] + report_df['Debit'] - report_df['Credit']
-                    
-                    # Cumulative Sum
+                # Custom Sort: BF first, then by Date and ID
+                final_df = db.load_statement(r_selected_ac, start_date, end_date, starting_balance, bf_before_dates=True)
 >>>>>>> 7a29223 (feat: Manual Entry improvements, BF transaction type, and Navigator filters)
-                    report_df['Balance'] = starting_balance + report_df['Net Change'].cumsum()
-                    
-                    # 4. Final Formatting
-                    # Columns needed: Date, BF, Debit, Credit, Balance, Others (Ref No)
+                
+                if not final_df.empty:
 <<<<<<< HEAD
-                    # Reordering to put BF first or last? Usually Date, Desc, BF, Debit, Credit, Balance
-                    # But here structure is Date, Debit, Credit, Balance, Others
-                    # Let's add BF before Debit
-                    final_df = report_df[['Document Date', 'BF', 'Debit', 'Credit', 'Balance', 'Reference No']].copy()
-                    final_df = final_df.rename(columns={'Document Date': 'Date', 'Reference No': 'Others'})
-                    
                     # Format for display
                     st.divider()
                     # st.markdown(f"**Statement for:** {r_selected_display}")
                     # st.markdown(f"**Period:** {r_start_date}")
                     
 =======
-                    final_df = report_df[['Document Date', 'BF', 'Debit', 'Credit', 'Balance', 'Reference No']].copy()
-                    final_df = final_df.rename(columns={'Document Date': 'Date', 'Reference No': 'Others'})
-                    
 >>>>>>> 7a29223 (feat: Manual Entry improvements, BF transaction type, and Navigator filters)
-                    # Create display copy for formatting
-                    display_df = final_df.copy()
-                    for col in ["BF", "Debit", "Credit", "Balance"]:
-                         display_df[col] = display_df[col].apply(lambda x: f"{x:,.2f}" if pd.notna(x) else "0.00")
+                    # Amounts stay numeric; the editor formats them client-side
+                    amount_cols = ["BF", "Debit", "Credit", "Balance"]
+                    display_df = final_df.fillna({col: 0.0 for col in amount_cols})
                     
                     st.success(f"Report Generated for {r_selected_display} ({period_str})")
                     
@@ -1494,10 +1786,10 @@ with tab_report:
                         display_df,
                         column_config={
                             "Date": st.column_config.TextColumn("Date"),
-                            "BF": st.column_config.TextColumn("BF"),
-                            "Debit": st.column_config.TextColumn("Debit"),
-                            "Credit": st.column_config.TextColumn("Credit"),
-                            "Balance": st.column_config.TextColumn("Balance"),
+                            "BF": st.column_config.NumberColumn("BF", format="accounting"),
+                            "Debit": st.column_config.NumberColumn("Debit", format="accounting"),
+                            "Credit": st.column_config.NumberColumn("Credit", format="accounting"),
+                            "Balance": st.column_config.NumberColumn("Balance", format="accounting"),
                             "Others": "Others"
                         },
                         use_container_width=True,
@@ -1507,36 +1799,26 @@ with tab_report:
 
                     # Export Button
                     report_filename = f"Statement_{r_selected_ac}_{r_year}{r_month}.xlsx"
-                    buffer = BytesIO()
-                    with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-                         # Write info as headers at the top
-                         final_df.to_excel(writer, index=False, sheet_name='Statement', startrow=3)
-                         
-                         workbook = writer.book
-                         worksheet = writer.sheets['Statement']
-                         
-                         # Add Header Info
-                         header_fmt = workbook.add_format({'bold': True, 'font_size': 12})
-                         worksheet.write(0, 0, f"Statement for: {r_selected_display}", header_fmt)
+                    # Header info at the top, then the statement rows (streamed)
 <<<<<<< HEAD
-                         worksheet.write(1, 0, f"Period: {r_month}/{r_year}", header_fmt)
-                         
-                         # Basic Excel Formatting
-                         fmt_currency = workbook.add_format({'num_format': '#,##0.00'})
-                         worksheet.set_column('B:E', 18, fmt_currency) # BF, Debit, Credit, Balance
+                    report_bytes = report_to_excel_bytes(
+                        final_df, 'Statement',
+                        [f"Statement for: {r_selected_display}", f"Period: {r_month}/{r_year}"],
+                        startrow=3,
+                        column_widths=[('A:A', 12, False), ('B:E', 18, True), ('F:F', 25, False)]  # Date, BF/Debit/Credit/Balance, Others
+                    )
 =======
-                         worksheet.write(1, 0, f"Period: {period_str}", header_fmt)
-                         
-                         # Basic Excel Formatting
-                         fmt_currency = workbook.add_format({'num_format': '#,##0.00'})
-                         worksheet.set_column('B:E', 15, fmt_currency) # BF, Debit, Credit, Balance
+                    report_bytes = report_to_excel_bytes(
+                        final_df, 'Statement',
+                        [f"Statement for: {r_selected_display}", f"Period: {period_str}"],
+                        startrow=3,
+                        column_widths=[('A:A', 12, False), ('B:E', 15, True), ('F:F', 25, False)]  # Date, BF/Debit/Credit/Balance, Others
+                    )
 >>>>>>> 7a29223 (feat: Manual Entry improvements, BF transaction type, and Navigator filters)
-                         worksheet.set_column('A:A', 12) # Date
-                         worksheet.set_column('F:F', 25) # Others
                     
                     st.download_button(
                         label="📥 Download Excel Report",
-                        data=buffer.getvalue(),
+                        data=report_bytes,
                         file_name=report_filename,
                         mime="application/vnd.ms-excel"
                     )
@@ -1553,7 +1835,7 @@ with tab_balance:
     st.subheader("💰 Bank Balance Summary Report")
     
     # Reuse functionality from Master Data
-    master_df = get_ac_master_data(master_path, os.path.getmtime(master_path) if os.path.exists(master_path) else 0)
+    master_df = get_ac_master_data()
     
 <<<<<<< HEAD
     with st.expander("🔍 Filter & Search Options", expanded=True):
@@ -1605,10 +1887,9 @@ with tab_balance:
 =======
     if not master_df.empty:
          # Create options with "All Accounts"
-        master_df['Display'] = master_df.apply(lambda x: f"{x['ACNO']} - {x['BankName']} - {x['AccountName']} {x.get('Branch NicName', '')}".strip(), axis=1)
+        master_labels, ac_mapping_bal, _ = get_master_ui()
         # Tab 5 allows "All Accounts"
-        ac_display_options_bal = ["-- All Accounts --"] + master_df['Display'].tolist()
-        ac_mapping_bal = dict(zip(master_df['Display'], master_df['ACNO']))
+        ac_display_options_bal = ["-- All Accounts --"] + master_labels
         
         # State management for expander
         if "bal_expanded" not in st.session_state:
@@ -1670,11 +1951,13 @@ with tab_balance:
                         'balance': 'BANK BAL.'
                     })
                     
-                    # Format balance
-                    display_curr_df['BANK BAL.'] = display_curr_df['BANK BAL.'].apply(lambda x: f"{x:,.2f}")
-                    
-                    # Display table
-                    st.dataframe(display_curr_df, use_container_width=True, hide_index=True)
+                    # Display table (balance stays numeric and is formatted client-side)
+                    st.dataframe(
+                        display_curr_df,
+                        column_config={"BANK BAL.": st.column_config.NumberColumn("BANK BAL.", format="accounting")},
+                        use_container_width=True,
+                        hide_index=True
+                    )
                     
                     # Currency Total
                     curr_total = curr_df['balance'].sum()
@@ -1700,23 +1983,16 @@ with tab_balance:
                         'currency': 'Currency'
                     })
                     
-                    buffer = BytesIO()
-                    with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-                        export_df.to_excel(writer, index=False, sheet_name='Balance Summary', startrow=2)
-                        workbook = writer.book
-                        worksheet = writer.sheets['Balance Summary']
-                        
-                        # Header info
-                        header_fmt = workbook.add_format({'bold': True, 'font_size': 12})
-                        worksheet.write(0, 0, f"Bank Balance Summary as of {bal_as_of_date.strftime('%Y-%m-%d')}", header_fmt)
-                        
-                        # Format currency columns
-                        fmt_currency = workbook.add_format({'num_format': '#,##0.00'})
-                        worksheet.set_column('E:H', 18, fmt_currency)
+                    report_bytes = report_to_excel_bytes(
+                        export_df, 'Balance Summary',
+                        [f"Bank Balance Summary as of {bal_as_of_date.strftime('%Y-%m-%d')}"],
+                        startrow=2,
+                        column_widths=[('E:H', 18, True)]  # Currency columns
+                    )
                     
                     st.download_button(
                         label="📥 Download Excel Report",
-                        data=buffer.getvalue(),
+                        data=report_bytes,
                         file_name=f"Balance_Summary_{bal_as_of_date.strftime('%Y%m%d')}.xlsx",
                         mime="application/vnd.ms-excel"
                     )
@@ -1750,10 +2026,10 @@ with tab_balance:
             df_bal = db.load_records(ac_no=b_selected_ac, start_date=start_date, end_date=end_date)
             
             if not df_bal.empty:
-                # Calculate BF, Debit, Credit
-                df_bal['BF'] = df_bal.apply(lambda x: x['Total Value'] if x['Transaction'] == 'BF' else 0.0, axis=1)
-                df_bal['Debit'] = df_bal.apply(lambda x: x['Total Value'] if x['Transaction'] == 'DEBIT' else 0.0, axis=1)
-                df_bal['Credit'] = df_bal.apply(lambda x: x['Total Value'] if x['Transaction'] == 'CREDIT' else 0.0, axis=1)
+                # Calculate BF, Debit, Credit with column masks instead of per-row apply
+                df_bal['BF'] = df_bal['Total Value'].where(df_bal['Transaction'].eq('BF'), 0.0)
+                df_bal['Debit'] = df_bal['Total Value'].where(df_bal['Transaction'].eq('DEBIT'), 0.0)
+                df_bal['Credit'] = df_bal['Total Value'].where(df_bal['Transaction'].eq('CREDIT'), 0.0)
                 
                 # Group By Account Details
                 # We group by A/C No, Bank Name, Currency, Company Name to avoid aggregating mixed types
@@ -1779,32 +2055,26 @@ with tab_balance:
                         "Bank Name": "Bank",
                         "Company Name": "Company",
                         "Currency": "Ccy",
-                        "BF": st.column_config.NumberColumn("B/F", format="%.2f"),
-                        "Debit": st.column_config.NumberColumn("Debit", format="%.2f"),
-                        "Credit": st.column_config.NumberColumn("Credit", format="%.2f"),
-                        "Bank Balance": st.column_config.NumberColumn("Bank Balance", format="%.2f")
+                        "BF": st.column_config.NumberColumn("B/F", format="accounting"),
+                        "Debit": st.column_config.NumberColumn("Debit", format="accounting"),
+                        "Credit": st.column_config.NumberColumn("Credit", format="accounting"),
+                        "Bank Balance": st.column_config.NumberColumn("Bank Balance", format="accounting")
                     },
                     use_container_width=True,
                     hide_index=True
                 )
                 
                 # Excel Export
-                buffer = BytesIO()
-                with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-                     summary.to_excel(writer, index=False, sheet_name='Summary', startrow=3)
-                     workbook = writer.book
-                     worksheet = writer.sheets['Summary']
-                     header_fmt = workbook.add_format({'bold': True, 'font_size': 12})
-                     worksheet.write(0, 0, f"Bank Balance Summary: {period_str}", header_fmt)
-                     
-                     fmt_num = workbook.add_format({'num_format': '#,##0.00'})
-                     # Adjust column widths based on expected content
-                     worksheet.set_column('A:D', 15) 
-                     worksheet.set_column('E:H', 15, fmt_num) # BF, Debit, Credit, Balance
+                report_bytes = report_to_excel_bytes(
+                    summary, 'Summary',
+                    [f"Bank Balance Summary: {period_str}"],
+                    startrow=3,
+                    column_widths=[('A:D', 15, False), ('E:H', 15, True)]  # Account details, BF/Debit/Credit/Balance
+                )
                 
                 st.download_button(
                     label="📥 Download Excel Report",
-                    data=buffer.getvalue(),
+                    data=report_bytes,
                     file_name=f"Balance_Summary_{pd.Timestamp.now().strftime('%Y%m%d')}.xlsx",
                     mime="application/vnd.ms-excel"
                 )
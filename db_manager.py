@@ -3,17 +3,26 @@ import pandas as pd
 import datetime
 import os
 import re
+import threading
 
 DB_NAME = "ocr_data.db"
 
 # Use a module-level connection for caching purposes
 _connection = None
+_connection_lock = threading.Lock()
 
 def get_connection():
-    """Create or reuse a database connection."""
+    """Create or reuse a database connection (one per process, shared by every session and thread)."""
     global _connection
     if _connection is None:
-        _connection = sqlite3.connect(DB_NAME, check_same_thread=False)
+        # Sessions starting together must not each open (and configure) their own handle
+        with _connection_lock:
+            if _connection is None:
+                conn = sqlite3.connect(DB_NAME, check_same_thread=False)
+                # WAL + NORMAL sync: one fsync per checkpoint instead of per commit
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                _connection = conn
     return _connection
 
 def init_db():
@@ -45,7 +54,11 @@ def init_db():
         # Column already exists, ignore error
         pass
     
-    # AC Master Table
+    # Indexes for the dashboard/report filters (COUNT/SUM and paging queries)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_transactions_filters ON transactions (bank_name, company_name, currency, doc_date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_transactions_ac_date ON transactions (ac_no, doc_date)")
+    
+    # AC Master Table (index below serves the list's ORDER BY bank_name, ac_no)
     c.execute("""
         CREATE TABLE IF NOT EXISTS ac_master (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -59,6 +72,45 @@ def init_db():
             timestamp TEXT
         )
     """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_ac_master_bank_acno ON ac_master (bank_name, ac_no)")
+    
+    # Change counter for ac_master, bumped by triggers so every writer (including tools outside the app) moves it
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS ac_master_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    """)
+    c.execute("INSERT OR IGNORE INTO ac_master_version (id, version) VALUES (1, 0)")
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        c.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS ac_master_version_{event.lower()} AFTER {event} ON ac_master
+            BEGIN
+                UPDATE ac_master_version SET version = version + 1 WHERE id = 1;
+            END
+        """)
+    
+    # OCR Cache Table: raw OCR text per PDF content hash and engine
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS ocr_cache (
+            file_hash TEXT,
+            engine TEXT,
+            raw_text TEXT,
+            timestamp TEXT,
+            PRIMARY KEY (file_hash, engine)
+        )
+    """)
+    
+    # One-off: rows saved before dates were normalized on save still hold e.g. dd/mm/yyyy,
+    # which breaks every ORDER BY doc_date and the date-range filters. user_version records that it ran.
+    if c.execute("PRAGMA user_version").fetchone()[0] < 1:
+        rows = c.execute("""
+            SELECT DISTINCT doc_date FROM transactions
+            WHERE doc_date IS NOT NULL AND doc_date NOT GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'
+        """).fetchall()
+        updates = [(normalize_date(d), d) for (d,) in rows]
+        c.executemany("UPDATE transactions SET doc_date = ? WHERE doc_date = ?", [u for u in updates if u[0] != u[1]])
+        c.execute("PRAGMA user_version = 1")
     
     conn.commit()
 
@@ -126,53 +178,54 @@ def save_records(df):
     if df.empty:
         return 0, "No data to save."
     
-    # Prepare data for insertion
-    records_to_save = []
+    # Prepare data for insertion (column-wise, no per-row iteration)
     current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     
-    for _, row in df.iterrows():
-        # Clean numeric value (remove commas)
-        val_str = str(row.get("Total Value", "0")).replace(",", "")
-        try:
-            total_val = float(val_str) if val_str and val_str != "nan" else 0.0
-        except ValueError:
-            total_val = 0.0
-            
-        doc_date = str(row.get("Document Date", ""))
-        normalized_doc_date = normalize_date(doc_date)
-        
-        records_to_save.append((
-            str(row.get("A/C No", "")),
-            str(row.get("Bank Name", "")),
-            str(row.get("Company Name", "")),
-            str(row.get("Currency", "")),
-            normalized_doc_date,
-            str(row.get("Reference No", "")),
-            total_val,
-            str(row.get("Transaction", "")),
-            str(row.get("Source File", "")),
-            current_time
-        ))
+    def text_column(name):
+        if name in df.columns:
+            return df[name].map(str)
+        return pd.Series("", index=df.index)
+    
+    # Clean numeric value (remove commas); anything unparseable becomes 0.0
+    total_values = pd.to_numeric(text_column("Total Value").str.replace(",", "", regex=False), errors="coerce").fillna(0.0)
+    
+    doc_dates = text_column("Document Date")
+    date_map = {d: normalize_date(d) for d in doc_dates.unique()}
+    normalized_doc_dates = doc_dates.map(date_map)
+    
+    records_to_save = list(zip(
+        text_column("A/C No"),
+        text_column("Bank Name"),
+        text_column("Company Name"),
+        text_column("Currency"),
+        normalized_doc_dates,
+        text_column("Reference No"),
+        total_values.astype(float),
+        text_column("Transaction"),
+        text_column("Source File"),
+        [current_time] * len(df)
+    ))
     
     conn = get_connection()
-    c = conn.cursor()
     try:
-        c.executemany("""
-            INSERT INTO transactions 
-            (ac_no, bank_name, company_name, currency, doc_date, ref_no, total_value, transaction_details, source_file, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, records_to_save)
-        conn.commit()
+        # Single transaction for the whole batch
+        with conn:
+            conn.executemany("""
+                INSERT INTO transactions 
+                (ac_no, bank_name, company_name, currency, doc_date, ref_no, total_value, transaction_details, source_file, timestamp)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, records_to_save)
         count = len(records_to_save)
         return count, f"Successfully saved {count} records to database."
     except Exception as e:
         return 0, f"Error saving to database: {str(e)}"
 
-def load_records(bank=None, company=None, currency=None, start_date=None, end_date=None, ac_no=None):
+def build_filter_clause(bank=None, company=None, currency=None, start_date=None, end_date=None, ac_no=None):
     """
-    Fetch records from the database with optional filters.
+    Build the WHERE clause shared by the transaction queries.
+    Returns (where_sql, params).
     """
-    query = "SELECT * FROM transactions WHERE 1=1"
+    query = " WHERE 1=1"
     params = []
     
     if ac_no and ac_no != "All":
@@ -198,9 +251,20 @@ def load_records(bank=None, company=None, currency=None, start_date=None, end_da
     if end_date:
         query += " AND doc_date <= ?"
         params.append(str(end_date))
+        
+    return query, params
 
-    # For Year/Month filtering if start_date/end_date are not provided
-    # Re-evaluating params for Year/Month selection
+def load_records(bank=None, company=None, currency=None, start_date=None, end_date=None, ac_no=None, limit=None, offset=0):
+    """
+    Fetch records from the database with optional filters.
+    Rows are ordered by Document Date then ID; pass limit/offset to fetch a single page.
+    """
+    where_sql, params = build_filter_clause(bank, company, currency, start_date, end_date, ac_no)
+    query = "SELECT * FROM transactions" + where_sql + " ORDER BY doc_date, id"
+    
+    if limit is not None:
+        query += " LIMIT ? OFFSET ?"
+        params.extend([int(limit), int(offset)])
     
     conn = get_connection()
     df = pd.read_sql_query(query, conn, params=params)
@@ -226,6 +290,60 @@ def load_records(bank=None, company=None, currency=None, start_date=None, end_da
         
     return df
 
+def load_statement(ac_no, start_date=None, end_date=None, starting_balance=0.0, bf_before_dates=False):
+    """
+    Bank statement rows for one account with the running balance computed in SQL.
+    BF rows sort first within their date, or before every other row when bf_before_dates is set.
+    Returns columns: Date, BF, Debit, Credit, Balance, Others (Reference No).
+    """
+    where_sql, params = build_filter_clause(start_date=start_date, end_date=end_date, ac_no=ac_no)
+    is_dated = "(transaction_details != 'BF')"
+    date_order = "doc_date IS NULL, doc_date"
+    if bf_before_dates:
+        order_sql = f"{is_dated}, {date_order}, id"
+    else:
+        order_sql = f"{date_order}, {is_dated}, id"
+    
+    query = f"""
+        SELECT
+            doc_date AS "Date",
+            CASE WHEN transaction_details = 'BF' THEN total_value ELSE 0 END AS "BF",
+            CASE WHEN transaction_details = 'DEBIT' THEN total_value ELSE 0 END AS "Debit",
+            CASE WHEN transaction_details = 'CREDIT' THEN total_value ELSE 0 END AS "Credit",
+            ? + SUM(
+                CASE transaction_details
+                    WHEN 'BF' THEN total_value
+                    WHEN 'DEBIT' THEN total_value
+                    WHEN 'CREDIT' THEN -total_value
+                    ELSE 0
+                END
+            ) OVER (ORDER BY {order_sql} ROWS UNBOUNDED PRECEDING) AS "Balance",
+            ref_no AS "Others"
+        FROM transactions{where_sql}
+        ORDER BY {order_sql}
+    """
+    conn = get_connection()
+    df = pd.read_sql_query(query, conn, params=[float(starting_balance)] + params)
+    df["Date"] = df["Date"].apply(normalize_date)
+    return df
+
+def get_records_summary(bank=None, company=None, currency=None, start_date=None, end_date=None, ac_no=None):
+    """
+    Count and total the records matching the filters without loading them.
+    Returns (record_count, total_value).
+    """
+    where_sql, params = build_filter_clause(bank, company, currency, start_date, end_date, ac_no)
+    conn = get_connection()
+    row = conn.execute("SELECT COUNT(*), COALESCE(SUM(total_value), 0) FROM transactions" + where_sql, params).fetchone()
+    return row[0], row[1]
+
+def get_filtered_ids(bank=None, company=None, currency=None, start_date=None, end_date=None, ac_no=None):
+    """Return the IDs of all records matching the filters, in load_records order."""
+    where_sql, params = build_filter_clause(bank, company, currency, start_date, end_date, ac_no)
+    conn = get_connection()
+    rows = conn.execute("SELECT id FROM transactions" + where_sql + " ORDER BY doc_date, id", params).fetchall()
+    return [r[0] for r in rows]
+
 def get_filter_options():
     """Get unique banks, companies, currencies, and account numbers for filter dropdowns."""
     conn = get_connection()
@@ -253,17 +371,23 @@ def get_filter_options():
     except Exception:
         return ["All"], ["All"], ["All"], ["All"], ["All"], ["All"]
 
+# Max IDs bound per "IN (...)" statement, well under SQLite's variable limit
+DELETE_BATCH_SIZE = 500
+
 def delete_records(ids):
-    """Delete records by ID list."""
+    """Delete records by ID list in a single transaction."""
     if not ids:
         return 0
     
+    ids = [int(i) for i in ids]
     conn = get_connection()
-    c = conn.cursor()
-    placeholders = ",".join(["?"] * len(ids))
-    c.execute(f"DELETE FROM transactions WHERE id IN ({placeholders})", ids)
-    conn.commit()
-    count = c.rowcount
+    count = 0
+    with conn:
+        for start in range(0, len(ids), DELETE_BATCH_SIZE):
+            batch = ids[start:start + DELETE_BATCH_SIZE]
+            placeholders = ",".join(["?"] * len(batch))
+            cur = conn.execute(f"DELETE FROM transactions WHERE id IN ({placeholders})", batch)
+            count += cur.rowcount
     return count
 
 def get_account_list():
@@ -424,6 +548,17 @@ def get_record_by_id(record_id):
 
 # --- MASTER DATA FUNCTIONS ---
 
+# ac_master columns renamed to the old Excel format's names for compatibility
+MASTER_COLUMN_RENAMES = {
+    "ac_no": "ACNO",
+    "bank_name": "BankName",
+    "branch": "Branch",
+    "branch_nic_name": "Branch NicName",
+    "account_name": "AccountName",
+    "account_type": "AccountType",
+    "currency": "Currency"
+}
+
 def get_all_master_records():
     """
     Fetch all master data records.
@@ -431,37 +566,65 @@ def get_all_master_records():
     """
     conn = get_connection()
     df = pd.read_sql_query("SELECT * FROM ac_master ORDER BY bank_name, ac_no", conn)
-    
-    # Rename columns to match old Excel format for compatibility
-    rename_map = {
-        "ac_no": "ACNO",
-        "bank_name": "BankName",
-        "branch": "Branch",
-        "branch_nic_name": "Branch NicName",
-        "account_name": "AccountName",
-        "account_type": "AccountType",
-        "currency": "Currency"
-    }
-    df = df.rename(columns=rename_map)
+    df = df.rename(columns=MASTER_COLUMN_RENAMES)
+    return df
+
+MASTER_SEARCH_COLUMNS = ["CAST(id AS TEXT)", "ac_no", "bank_name", "branch", "branch_nic_name",
+                         "account_name", "account_type", "currency", "timestamp"]
+
+def search_master_records(term):
+    """
+    Fetch master records where any column contains term (case-insensitive for ASCII letters).
+    Returns a DataFrame in the same order and with the same column names as get_all_master_records.
+    """
+    # Match term literally: escape LIKE wildcards
+    pattern = "%" + re.sub(r"([\\%_])", r"\\\1", term) + "%"
+    where_sql = " OR ".join(f"{col} LIKE ? ESCAPE '\\'" for col in MASTER_SEARCH_COLUMNS)
+    conn = get_connection()
+    df = pd.read_sql_query(
+        f"SELECT * FROM ac_master WHERE {where_sql} ORDER BY bank_name, ac_no",
+        conn, params=[pattern] * len(MASTER_SEARCH_COLUMNS)
+    )
+    df = df.rename(columns=MASTER_COLUMN_RENAMES)
     return df
 
+def get_db_mtime():
+    """
+    Latest modification time (ns) of the database file and its WAL, cheap enough to check on every rerun.
+    In WAL mode commits land in the -wal file until a checkpoint, so both are checked.
+    """
+    mtimes = [0]
+    for path in (DB_NAME, DB_NAME + "-wal"):
+        try:
+            mtimes.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            pass
+    return max(mtimes)
+
+def get_master_version():
+    """
+    Change counter of the ac_master table (a single-row read).
+    Triggers bump it on every insert, update and delete, whoever makes the change.
+    """
+    conn = get_connection()
+    return conn.execute("SELECT version FROM ac_master_version WHERE id = 1").fetchone()[0]
+
 def get_master_record_by_id(record_id):
     """Fetch single master record by ID."""
     conn = get_connection()
     df = pd.read_sql_query("SELECT * FROM ac_master WHERE id = ?", conn, params=[record_id])
     if df.empty:
         return None
-        
-    rename_map = {
-        "ac_no": "ACNO",
-        "bank_name": "BankName",
-        "branch": "Branch",
-        "branch_nic_name": "Branch NicName",
-        "account_name": "AccountName",
-        "account_type": "AccountType",
-        "currency": "Currency"
-    }
-    df = df.rename(columns=rename_map)
+    df = df.rename(columns=MASTER_COLUMN_RENAMES)
+    return df.iloc[0].to_dict()
+
+def get_master_record_by_acno(ac_no):
+    """Fetch single master record by A/C No (exact match on the stored value)."""
+    conn = get_connection()
+    df = pd.read_sql_query("SELECT * FROM ac_master WHERE ac_no = ?", conn, params=[ac_no])
+    if df.empty:
+        return None
+    df = df.rename(columns=MASTER_COLUMN_RENAMES)
     return df.iloc[0].to_dict()
 
 def add_master_record(data):
@@ -539,14 +702,18 @@ def update_master_record(record_id, data):
         return False, f"Error updating record: {str(e)}"
 
 def delete_master_records(ids):
-    """Delete master records by ID list."""
+    """Delete master records by ID list in a single transaction."""
     if not ids: return 0
+    ids = [int(i) for i in ids]
     conn = get_connection()
-    c = conn.cursor()
-    placeholders = ",".join(["?"] * len(ids))
-    c.execute(f"DELETE FROM ac_master WHERE id IN ({placeholders})", ids)
-    conn.commit()
-    return c.rowcount
+    count = 0
+    with conn:
+        for start in range(0, len(ids), DELETE_BATCH_SIZE):
+            batch = ids[start:start + DELETE_BATCH_SIZE]
+            placeholders = ",".join(["?"] * len(batch))
+            cur = conn.execute(f"DELETE FROM ac_master WHERE id IN ({placeholders})", batch)
+            count += cur.rowcount
+    return count
 
 def migrate_excel_to_db(excel_path):
     """
@@ -602,38 +769,100 @@ def migrate_excel_to_db(excel_path):
     except Exception as e:
         return 0, f"Error during migration: {str(e)}"
 
+# Normalized master rows and memoized lookups, rebuilt whenever get_master_version() changes
+_master_lookup_cache = {"version": None, "rows": [], "results": {}}
+
+def _get_master_lookup_cache():
+    """
+    Current snapshot of the normalized master rows and their memoized lookups.
+    A refresh builds a new snapshot and swaps it in with one assignment, so threads still matching
+    against the old one only ever write into the old snapshot's results.
+    """
+    global _master_lookup_cache
+    snapshot = _master_lookup_cache
+    version = get_master_version()
+    if snapshot["version"] != version:
+        conn = get_connection()
+        rows = conn.execute("SELECT ac_no, bank_name, account_name, currency, branch FROM ac_master").fetchall()
+        snapshot = {
+            "version": version,
+            "rows": [
+                (str(r[0]).strip().replace("'", "").replace(" ", "").replace("-", ""),) + tuple(r[1:])
+                for r in rows
+            ],
+            "results": {},
+        }
+        _master_lookup_cache = snapshot
+    return snapshot
+
+_NO_MASTER_MATCH = (None, None, None, None)
+
+def _match_master(cache, ac_no):
+    """Resolve one A/C No against the given _get_master_lookup_cache() snapshot only, memoizing the result in it."""
+    clean_input = str(ac_no).strip().replace(" ", "").replace("-", "") if ac_no else ""
+    if not clean_input:
+        return _NO_MASTER_MATCH
+
+    results = cache["results"]
+    if clean_input not in results:
+        # Match logic: input in DB_AC or DB_AC in input; first match wins
+        results[clean_input] = next(
+            (row[1:] for row in cache["rows"] if row[0] in clean_input or clean_input in row[0]),
+            _NO_MASTER_MATCH
+        )
+    return results[clean_input]
+
 def lookup_master_info(ac_no):
     """
     Lookup Bank, Company, and Currency from master data based on A/C No.
     Supports partial matching (input in DB or DB in input).
+    The master table is read once per version, and results are memoized per A/C No.
     Returns: (BankName, AccountName, Currency, Branch) or (None, None, None, None)
     """
     if not ac_no:
-        return None, None, None, None
-        
-    clean_input = str(ac_no).strip().replace(" ", "").replace("-", "")
-    if not clean_input:
-        return None, None, None, None
+        return _NO_MASTER_MATCH
 
-    conn = get_connection()
     try:
-        # Fetch all ACNOs to perform flexible matching in Python
-        # (Since SQLite restricted LIKE/INSTR might miss some fuzzy cases or reverse containment)
-        df = pd.read_sql_query("SELECT ac_no, bank_name, account_name, currency, branch FROM ac_master", conn)
-        
-        # Normalize DB ACNOs
-        df['clean_ac'] = df['ac_no'].astype(str).str.strip().str.replace("'", "").str.replace(" ", "").str.replace("-", "")
-        
-        # Match logic: input in DB_AC or DB_AC in input
-        match = df[df['clean_ac'].apply(lambda x: x in clean_input or clean_input in x)]
-        
-        if not match.empty:
-            # Return first match
-            row = match.iloc[0]
-            return row['bank_name'], row['account_name'], row['currency'], row['branch']
-            
+        cache = _get_master_lookup_cache()
     except Exception as e:
         print(f"DB Lookup Error: {e}")
-        return None, None, None, None
+        return _NO_MASTER_MATCH
 
-    return None, None, None, None
+    return _match_master(cache, ac_no)
+
+def lookup_master_info_bulk(ac_nos):
+    """
+    lookup_master_info for many A/C Nos with a single master version check.
+    Returns {ac_no: (BankName, AccountName, Currency, Branch)} for each distinct input.
+    """
+    ac_nos = set(ac_nos)
+    try:
+        cache = _get_master_lookup_cache()
+    except Exception as e:
+        print(f"DB Lookup Error: {e}")
+        return {ac_no: _NO_MASTER_MATCH for ac_no in ac_nos}
+
+    return {ac_no: _match_master(cache, ac_no) for ac_no in ac_nos}
+
+def get_cached_ocr_text(file_hash, engine):
+    """Return the raw OCR text previously stored for this file hash and engine, or None."""
+    conn = get_connection()
+    try:
+        row = conn.execute("SELECT raw_text FROM ocr_cache WHERE file_hash = ? AND engine = ?", (file_hash, engine)).fetchone()
+    except sqlite3.Error as e:
+        print(f"OCR cache read error: {e}")
+        return None
+    return row[0] if row else None
+
+def save_cached_ocr_text(file_hash, engine, raw_text):
+    """Store (or replace) the raw OCR text for this file hash and engine."""
+    conn = get_connection()
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    try:
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO ocr_cache (file_hash, engine, raw_text, timestamp) VALUES (?, ?, ?, ?)",
+                (file_hash, engine, raw_text, timestamp)
+            )
+    except sqlite3.Error as e:
+        print(f"OCR cache write error: {e}")
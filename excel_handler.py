@@ -1,41 +1,120 @@
 import pandas as pd
 import os
-from openpyxl import load_workbook
+import xlsxwriter
+from xlsxwriter.utility import xl_col_to_name
+from io import BytesIO
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+
+TOTAL_VALUE_FORMAT = '#,##0.00'
+
+def _rows_for_excel(df, columns):
+    """Yield df rows as lists ordered by columns, with NaN converted to empty cells."""
+    aligned = df.reindex(columns=columns).astype(object)
+    aligned = aligned.where(pd.notna(aligned), None)
+    for row in aligned.itertuples(index=False, name=None):
+        yield list(row)
 
 def append_to_excel(df, target_path):
     """
     Appends a dataframe to an existing Excel file or creates a new one.
+    Existing rows are never re-read or rewritten; new rows are appended to the active sheet.
     """
     if not os.path.exists(target_path):
-        df.to_excel(target_path, index=False)
+        # Stream rows into a write-only workbook
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet('Sheet1')
+        columns = list(df.columns)
+        ws.append(columns)
+        value_idx = columns.index("Total Value") if "Total Value" in columns else None
+        for row in _rows_for_excel(df, columns):
+            if value_idx is not None:
+                cell = WriteOnlyCell(ws, value=row[value_idx])
+                cell.number_format = TOTAL_VALUE_FORMAT
+                row[value_idx] = cell
+            ws.append(row)
+        wb.save(target_path)
         return f"Created new file: {target_path}"
-    
+
     try:
-        with pd.ExcelWriter(target_path, mode='a', engine='openpyxl', if_sheet_exists='overlay') as writer:
-            # Load existing sheet or create new one
-            try:
-                existing_df = pd.read_excel(target_path)
-                combined_df = pd.concat([existing_df, df], ignore_index=True)
-                combined_df.to_excel(writer, index=False, sheet_name='Sheet1')
-            except Exception:
-                df.to_excel(writer, index=False, sheet_name='Sheet1')
-        
-        # Apply formatting using openpyxl directly
+        # keep_links stays on: openpyxl only writes back the external links it loaded
         wb = load_workbook(target_path)
         ws = wb.active
-        # Find 'Total Value' column index
-        header = [cell.value for cell in ws[1]]
+
+        # Align new rows to the existing header by position; blank header cells keep their column.
+        # Only trailing blanks are dropped, and unknown columns are added after the last used column.
+        header = [cell.value for cell in ws[1]] if ws.max_row >= 1 else []
+        while header and header[-1] is None:
+            header.pop()
+        new_cols = [c for c in df.columns if c not in header]
+        first_new_col = max(ws.max_column, len(header)) + 1 if header else 1
+        for offset, col in enumerate(new_cols, start=first_new_col):
+            ws.cell(row=1, column=offset, value=col)
+        header += [None] * (first_new_col - 1 - len(header)) + new_cols
+
+        # Columns with a name are filled from df; blank slots stay empty
+        positions = [i for i, h in enumerate(header) if h is not None]
+        names = [header[i] for i in positions]
+        first_new_row = ws.max_row + 1
+        for values in _rows_for_excel(df, names):
+            row = [None] * len(header)
+            for i, value in zip(positions, values):
+                row[i] = value
+            ws.append(row)
+
+        # Apply formatting to the appended rows only
         if "Total Value" in header:
             col_idx = header.index("Total Value") + 1
-            # Apply format to all rows in this column (except header)
-            for row in range(2, ws.max_row + 1):
-                ws.cell(row=row, column=col_idx).number_format = '#,##0.00'
+            for row in range(first_new_row, ws.max_row + 1):
+                ws.cell(row=row, column=col_idx).number_format = TOTAL_VALUE_FORMAT
         wb.save(target_path)
-        
+
         return f"Appended data to: {target_path}"
     except Exception as e:
         return f"Error appending to Excel: {e}"
 
+def _write_report(target, df, sheet_name, title_lines, startrow, column_widths):
+    """
+    Write a report workbook to target (a path or a file-like object): bold title lines at the top,
+    df's header at startrow, then its rows.
+    Uses xlsxwriter's constant_memory mode, so each row is flushed as soon as the next one starts.
+    column_widths is a list of (column range, width, is_currency), e.g. ('B:E', 18, True).
+    """
+    workbook = xlsxwriter.Workbook(target, {'constant_memory': True, 'default_date_format': 'yyyy-mm-dd'})
+    worksheet = workbook.add_worksheet(sheet_name)
+    title_fmt = workbook.add_format({'bold': True, 'font_size': 12})
+    header_fmt = workbook.add_format({'bold': True, 'border': 1, 'align': 'center'})
+    currency_fmt = workbook.add_format({'num_format': TOTAL_VALUE_FORMAT})
+
+    # constant_memory only keeps the current row, so everything is written top to bottom
+    for col_range, width, is_currency in column_widths:
+        worksheet.set_column(col_range, width, currency_fmt if is_currency else None)
+    for row, line in enumerate(title_lines):
+        worksheet.write(row, 0, line, title_fmt)
+    columns = list(df.columns)
+    worksheet.write_row(startrow, 0, columns, header_fmt)
+    for row, values in enumerate(_rows_for_excel(df, columns), start=startrow + 1):
+        worksheet.write_row(row, 0, values)
+
+    workbook.close()
+
+def report_to_excel_bytes(df, sheet_name, title_lines, startrow, column_widths):
+    """Build a downloadable report in memory (see _write_report) and return the .xlsx bytes."""
+    buffer = BytesIO()
+    _write_report(buffer, df, sheet_name, title_lines, startrow, column_widths)
+    return buffer.getvalue()
+
+def export_to_excel(df, target_path, sheet_name='Sheet1'):
+    """
+    Stream df to a new .xlsx file: header row, then the rows, written to disk as they go
+    instead of being built up as an openpyxl workbook first. Total Value gets the number format.
+    """
+    column_widths = []
+    if "Total Value" in df.columns:
+        col = xl_col_to_name(df.columns.get_loc("Total Value"))
+        column_widths.append((f'{col}:{col}', 15, True))
+    _write_report(target_path, df, sheet_name, [], 0, column_widths)
+
 def load_master_data(master_path):
     if os.path.exists(master_path):
         return pd.read_excel(master_path)
@@ -1,10 +1,20 @@
 import os
 import re
 import json
+import asyncio
+import queue
+import threading
+import hashlib
+import time
+import aiohttp
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pytesseract
+import fitz  # PyMuPDF
 import pandas as pd
 from pdf2image import convert_from_path
+from PIL import Image
 import base64
 from io import BytesIO
 
@@ -30,61 +40,392 @@ def setup_tesseract():
     if os.path.exists(TESSERACT_CMD):
         pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
 
-def ocr_tesseract(pdf_path):
+# Cap the OpenMP threads each tesseract process may use (inherited from our environment).
+# Pages are OCR'd in parallel, so one thread per process avoids oversubscribing the CPU.
+# Set once at import: the environment is process-wide, shared by every session and OCR run.
+# An OMP_THREAD_LIMIT already set by whoever launches the app is kept.
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+# A page needs at least this many characters of embedded text to skip OCR
+MIN_EMBEDDED_TEXT_CHARS = 20
+
+# PyMuPDF is not thread-safe: every fitz open/render/extract in the process takes this lock,
+# here and in the app's preview (the pipeline's render stage, Typhoon's to_thread calls and
+# Streamlit sessions all run concurrently). It is held per page so no caller waits long.
+FITZ_LOCK = threading.Lock()
+
+def extract_embedded_text(pdf_path):
+    """
+    Return the PDF's own text layer (with page markers) if every page is born-digital,
+    otherwise None so the caller falls back to OCR.
+    """
+    pages = []
+    doc = None
+    try:
+        with FITZ_LOCK:
+            doc = fitz.open(pdf_path)
+            page_count = doc.page_count
+        for page_no in range(page_count):
+            with FITZ_LOCK:
+                page_text = doc.load_page(page_no).get_text()
+            # Scanned PDFs usually fail on page 1, so stop reading as soon as one page needs OCR
+            if len(page_text.strip()) < MIN_EMBEDDED_TEXT_CHARS:
+                return None
+            pages.append(page_text)
+    except Exception as e:
+        print(f"Could not read text layer of {pdf_path}: {e}")
+        return None
+    finally:
+        if doc is not None:
+            with FITZ_LOCK:
+                doc.close()
+    
+    if not pages:
+        return None
+    
+    return "".join(f"--- Page {i + 1} ---\n{page_text}\n\n" for i, page_text in enumerate(pages))
+
+# Same resolution pdf2image used by default
+OCR_RENDER_DPI = 200
+
+def file_fingerprint(pdf_path):
+    """blake2b of the PDF's bytes, so identical files share OCR cache entries wherever they live."""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(pdf_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def ocr_cache_engine(engine, api_key):
+    """Engine name the OCR cache is keyed on (Typhoon without a key runs Tesseract)."""
+    return "Typhoon" if engine == "Typhoon" and api_key else "Tesseract"
+
+def find_existing_text(pdf_path, cache_engine, force_ocr=False):
+    """
+    Look for text that lets a PDF skip OCR: its own text layer ("embedded") or the stored
+    output of an earlier OCR run on identical bytes ("cache").
+    Returns (text, text_source, file_hash); text is None when the PDF needs OCR.
+    force_ocr skips both checks.
+    """
+    if not force_ocr:
+        text = extract_embedded_text(pdf_path)
+        if text is not None:
+            print(f"Born-digital PDF, skipping OCR: {os.path.basename(pdf_path)}")
+            return text, "embedded", None
+    
+    file_hash = file_fingerprint(pdf_path)
+    if not force_ocr:
+        text = db.get_cached_ocr_text(file_hash, cache_engine)
+        if text is not None:
+            print(f"OCR cache hit, skipping OCR: {os.path.basename(pdf_path)}")
+            return text, "cache", file_hash
+    return None, "ocr", file_hash
+
+def store_ocr_text(file_hash, cache_engine, text):
+    """Remember OCR output for next time, unless some pages had to fall back to Tesseract."""
+    if file_hash and "(Fallback Tesseract)" not in text:
+        db.save_cached_ocr_text(file_hash, cache_engine, text)
+
+def pdf_to_images(pdf_path):
+    """
+    Rasterize every page with PyMuPDF (in-process, one open document for all pages).
+    Falls back to Poppler via pdf2image if MuPDF can't render the file.
+    """
+    doc = None
+    try:
+        with FITZ_LOCK:
+            doc = fitz.open(pdf_path)
+            page_count = doc.page_count
+        images = []
+        for page_no in range(page_count):
+            with FITZ_LOCK:
+                pix = doc.load_page(page_no).get_pixmap(dpi=OCR_RENDER_DPI)
+            images.append(Image.frombytes("RGB", (pix.width, pix.height), pix.samples))
+        return images
+    except Exception as e:
+        print(f"PyMuPDF could not render {pdf_path}, falling back to Poppler: {e}")
+        # Split the pages across several pdftoppm processes instead of one
+        return convert_from_path(
+            pdf_path, dpi=OCR_RENDER_DPI, poppler_path=POPPLER_PATH,
+            thread_count=max(1, (os.cpu_count() or 1) - 1)
+        )
+    finally:
+        if doc is not None:
+            with FITZ_LOCK:
+                doc.close()
+
+def encode_page_image(img):
+    """
+    PNG-encode one rasterized page for reuse by the preview pane.
+    The page is halved in size (OCR renders at 200 DPI, preview needs ~100).
+    """
+    buffered = BytesIO()
+    # Fast zlib level: these PNGs only live in session memory, and level 1 is ~30% quicker at about the same size
+    img.reduce(2).save(buffered, format="PNG", compress_level=1)
+    return buffered.getvalue()
+
+def encode_page_images(images):
+    """Returns {page_num: png_bytes} for all rasterized pages."""
+    return {i + 1: encode_page_image(img) for i, img in enumerate(images)}
+
+def ocr_tesseract_page(page_no, img):
+    page_text = pytesseract.image_to_string(img, lang='tha+eng')
+    return f"--- Page {page_no} ---\n{page_text}\n\n"
+
+def ocr_tesseract(pdf_path, images=None):
     setup_tesseract()
-    images = convert_from_path(pdf_path, poppler_path=POPPLER_PATH)
-    text = ""
-    for i, image in enumerate(images):
-        page_text = pytesseract.image_to_string(image, lang='tha+eng')
-        text += f"--- Page {i + 1} ---\n{page_text}\n\n"
-    return text
-
-def ocr_typhoon(pdf_path, api_key):
-    url = "https://api.opentyphoon.ai/v1/chat/completions"
-    headers = {
+    if images is None:
+        images = pdf_to_images(pdf_path)
+    return "".join(ocr_tesseract_page(i + 1, image) for i, image in enumerate(images))
+
+TYPHOON_URL = "https://api.opentyphoon.ai/v1/chat/completions"
+# Max in-flight Typhoon requests for the async path
+TYPHOON_MAX_CONCURRENCY = 16
+# Pages sent together in one Typhoon request (1 = one request per page; batching is opt-in)
+TYPHOON_BATCH_SIZE = 1
+# How long a partly filled batch waits for more pages (from any file) before it is sent anyway
+TYPHOON_BATCH_MAX_WAIT_MS = 250
+TYPHOON_PAGE_MARKER = re.compile(r'^=== PAGE (\d+) ===[ \t]*$', re.MULTILINE)
+# Client-side cap on Typhoon requests per second, shared by every thread and coroutine
+TYPHOON_MAX_RPS = 5
+# Throttling / transient server errors are retried with exponential backoff
+TYPHOON_RETRIES = 3
+TYPHOON_BACKOFF = 0.5
+TYPHOON_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+class RateLimiter:
+    """Token bucket: at most `rate` requests per second, with bursts of up to `rate`."""
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token and return how many seconds the caller must wait before using it."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+    def wait(self):
+        time.sleep(self.reserve())
+
+    async def wait_async(self):
+        await asyncio.sleep(self.reserve())
+
+typhoon_limiter = RateLimiter(TYPHOON_MAX_RPS)
+_typhoon_session = None
+_typhoon_session_lock = threading.Lock()
+
+def get_typhoon_session():
+    """Shared requests session with pooled connections and retries on throttling/5xx."""
+    global _typhoon_session
+    with _typhoon_session_lock:
+        if _typhoon_session is None:
+            retry = Retry(
+                total=TYPHOON_RETRIES,
+                backoff_factor=TYPHOON_BACKOFF,
+                status_forcelist=TYPHOON_RETRY_STATUSES,
+                allowed_methods=["POST"],
+            )
+            session = requests.Session()
+            session.mount("https://", HTTPAdapter(max_retries=retry, pool_connections=4, pool_maxsize=32))
+            _typhoon_session = session
+        return _typhoon_session
+
+async def typhoon_post_async(session, headers, payload, timeout):
+    """POST to Typhoon under the rate limit, retrying throttling/5xx like the requests session does."""
+    for attempt in range(TYPHOON_RETRIES + 1):
+        await typhoon_limiter.wait_async()
+        async with session.post(TYPHOON_URL, headers=headers, json=payload, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            if response.status in TYPHOON_RETRY_STATUSES and attempt < TYPHOON_RETRIES:
+                retry_after = response.headers.get("Retry-After", "")
+                delay = float(retry_after) if retry_after.isdigit() else TYPHOON_BACKOFF * (2 ** attempt)
+            else:
+                response.raise_for_status()
+                return (await response.json())['choices'][0]['message']['content']
+        await asyncio.sleep(delay)
+
+def typhoon_headers(api_key):
+    return {
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json"
     }
+
+def typhoon_image_part(img):
+    buffered = BytesIO()
+    img.save(buffered, format="JPEG")
+    img_str = base64.b64encode(buffered.getvalue()).decode()
+    return {
+        "type": "image_url",
+        "image_url": {
+            "url": f"data:image/jpeg;base64,{img_str}"
+        }
+    }
+
+def build_typhoon_payload(img):
+    """Encode one page image as a Typhoon vision chat request."""
+    return {
+        "model": "typhoon-v1.5-vision-preview",
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": "Extract all text from this bank document page accurately. Return only the extracted text."},
+                    typhoon_image_part(img)
+                ]
+            }
+        ],
+        "max_tokens": 2048
+    }
+
+def build_typhoon_batch_payload(images):
+    """Encode several page images as one Typhoon request; the reply marks where each page starts."""
+    prompt = (
+        f"The following {len(images)} images are bank document pages. "
+        "Extract all text from each page accurately. Before each page's text write a line "
+        "'=== PAGE n ===' where n is the page's position (1, 2, ...). Return only the marked text."
+    )
+    return {
+        "model": "typhoon-v1.5-vision-preview",
+        "messages": [
+            {
+                "role": "user",
+                "content": [{"type": "text", "text": prompt}] + [typhoon_image_part(img) for img in images]
+            }
+        ],
+        "max_tokens": 2048 * len(images)
+    }
+
+def split_typhoon_batch(content, count):
+    """Split a batched reply into per-page texts, or None when the page markers don't line up."""
+    parts = TYPHOON_PAGE_MARKER.split(content)
+    # parts = [preamble, "1", text1, "2", text2, ...]
+    numbers = [int(n) for n in parts[1::2]]
+    if numbers != list(range(1, count + 1)):
+        return None
+    return [text.strip() for text in parts[2::2]]
+
+def ocr_typhoon_page(headers, page_no, img):
+    payload = build_typhoon_payload(img)
     
-    images = convert_from_path(pdf_path, poppler_path=POPPLER_PATH)
-    full_text = ""
+    try:
+        typhoon_limiter.wait()
+        response = get_typhoon_session().post(TYPHOON_URL, headers=headers, json=payload, timeout=60)
+        response.raise_for_status()
+        page_text = response.json()['choices'][0]['message']['content']
+        return f"--- Page {page_no} ---\n{page_text}\n\n"
+    except Exception as e:
+        print(f"Typhoon error on page {page_no}: {e}")
+        setup_tesseract()
+        page_text = pytesseract.image_to_string(img, lang='tha+eng')
+        return f"--- Page {page_no} (Fallback Tesseract) ---\n{page_text}\n\n"
+
+def ocr_typhoon(pdf_path, api_key, images=None):
+    headers = typhoon_headers(api_key)
     
-    for i, img in enumerate(images):
-        buffered = BytesIO()
-        img.save(buffered, format="JPEG")
-        img_str = base64.b64encode(buffered.getvalue()).decode()
-        
-        payload = {
-            "model": "typhoon-v1.5-vision-preview",
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": "Extract all text from this bank document page accurately. Return only the extracted text."},
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{img_str}"
-                            }
-                        }
-                    ]
-                }
-            ],
-            "max_tokens": 2048
-        }
-        
+    if images is None:
+        images = pdf_to_images(pdf_path)
+    return "".join(ocr_typhoon_page(headers, i + 1, img) for i, img in enumerate(images))
+
+async def ocr_typhoon_page_async(session, sem, headers, page_no, img):
+    payload = build_typhoon_payload(img)
+    try:
+        async with sem:
+            page_text = await typhoon_post_async(session, headers, payload, timeout=60)
+        return f"--- Page {page_no} ---\n{page_text}\n\n"
+    except Exception as e:
+        print(f"Typhoon error on page {page_no}: {e}")
+        setup_tesseract()
+        page_text = await asyncio.to_thread(pytesseract.image_to_string, img, lang='tha+eng')
+        return f"--- Page {page_no} (Fallback Tesseract) ---\n{page_text}\n\n"
+
+async def ocr_typhoon_batch_async(session, sem, headers, page_nos, images):
+    """
+    OCR several pages (page_nos labels each image's section) with a single Typhoon request.
+    Falls back to one request per page if the call fails or the reply can't be split by page.
+    """
+    if len(images) == 1:
+        return [await ocr_typhoon_page_async(session, sem, headers, page_nos[0], images[0])]
+    
+    payload = await asyncio.to_thread(build_typhoon_batch_payload, images)
+    try:
+        async with sem:
+            content = await typhoon_post_async(session, headers, payload, timeout=60 * len(images))
+        page_texts = split_typhoon_batch(content, len(images))
+        if page_texts is None:
+            raise ValueError("reply is missing page markers")
+        return [f"--- Page {page_no} ---\n{text}\n\n" for page_no, text in zip(page_nos, page_texts)]
+    except Exception as e:
+        print(f"Typhoon batch error on pages {page_nos}, retrying per page: {e}")
+        return await asyncio.gather(*[
+            ocr_typhoon_page_async(session, sem, headers, page_no, img) for page_no, img in zip(page_nos, images)
+        ])
+
+class TyphoonBatcher:
+    """
+    Mini-batches pages into shared Typhoon requests, across files when one batcher serves a whole run.
+    A batch is sent once it holds batch_size pages or its first page has waited max_wait_ms;
+    the future submit() returns resolves to that page's text section.
+    """
+    def __init__(self, session, sem, headers, batch_size=TYPHOON_BATCH_SIZE, max_wait_ms=TYPHOON_BATCH_MAX_WAIT_MS):
+        self.session = session
+        self.sem = sem
+        self.headers = headers
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max(0, max_wait_ms) / 1000
+        self.pending = []
+        self.timer = None
+        # Batches in flight, referenced so their tasks aren't garbage-collected
+        self.tasks = set()
+
+    def submit(self, page_no, img):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((page_no, img, future))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(self.max_wait, self.flush)
+        return future
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+        task = asyncio.ensure_future(self.send(batch))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def send(self, batch):
+        page_nos, images, futures = zip(*batch)
         try:
-            response = requests.post(url, headers=headers, json=payload, timeout=60)
-            response.raise_for_status()
-            page_text = response.json()['choices'][0]['message']['content']
-            full_text += f"--- Page {i + 1} ---\n{page_text}\n\n"
+            sections = await ocr_typhoon_batch_async(self.session, self.sem, self.headers, list(page_nos), list(images))
         except Exception as e:
-            print(f"Typhoon error on page {i+1}: {e}")
-            setup_tesseract()
-            page_text = pytesseract.image_to_string(img, lang='tha+eng')
-            full_text += f"--- Page {i + 1} (Fallback Tesseract) ---\n{page_text}\n\n"
-            
-    return full_text
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future, section in zip(futures, sections):
+            if not future.done():
+                future.set_result(section)
+
+async def ocr_typhoon_async(pdf_path, api_key, session, sem, images=None, batcher=None):
+    """
+    Same output as ocr_typhoon, but pages are sent concurrently (bounded by sem) through batcher,
+    a TyphoonBatcher shared by the run; without one, this file's pages are batched on their own.
+    """
+    if images is None:
+        images = await asyncio.to_thread(pdf_to_images, pdf_path)
+    if batcher is None:
+        batcher = TyphoonBatcher(session, sem, typhoon_headers(api_key))
+    sections = await asyncio.gather(*[batcher.submit(i + 1, img) for i, img in enumerate(images)])
+    return "".join(sections)
 
 # --- Parser Strategy Pattern ---
 
@@ -328,30 +669,197 @@ def extract_all_entries(text):
 
 import db_manager as db
 
-def lookup_master(ac_no, master_path=None):
-    """
-    Lookup Bank, Company, and Currency from Database.
-    master_path argument is kept for compatibility but ignored.
-    """
-    return db.lookup_master_info(ac_no)
-
-def process_single_pdf(pdf_path, engine="Tesseract", api_key=None, master_path=None):
-    if engine == "Typhoon" and api_key:
-        text = ocr_typhoon(pdf_path, api_key)
-    else:
-        text = ocr_tesseract(pdf_path)
-    
+def parse_ocr_text(text, master_path=None):
+    """Extract entries from raw OCR text and fill master data. Returns (entries, text)."""
     entries = extract_all_entries(text)
     
+    # Statements repeat the same account on every page: look up each distinct one,
+    # all against a single check of the master table's version
+    lookups = db.lookup_master_info_bulk(data["A/C No"] for data in entries) if master_path else {}
     for data in entries:
         if master_path:
-            bank, company, currency, branch = lookup_master(data["A/C No"], master_path)
+            bank, company, currency, branch = lookups[data["A/C No"]]
             data["Bank Name"] = bank
             data["Company Name"] = company
             data["Currency"] = currency
             
     return entries, text
 
+def process_single_pdf(pdf_path, engine="Tesseract", api_key=None, master_path=None, force_ocr=False):
+    """
+    OCR one PDF and extract its entries.
+    Returns (entries, raw_text, page_images, text_source):
+    - page_images is {page_num: png_bytes} so the caller can preview pages without
+      rasterizing the PDF again (empty when OCR was skipped)
+    - text_source is "embedded" for born-digital PDFs, "cache" when an earlier OCR run
+      of the same file was reused, otherwise "ocr"
+    force_ocr skips the text-layer and cache checks and always OCRs.
+    """
+    cache_engine = ocr_cache_engine(engine, api_key)
+    text, text_source, file_hash = find_existing_text(pdf_path, cache_engine, force_ocr)
+    if text is not None:
+        entries, text = parse_ocr_text(text, master_path)
+        return entries, text, {}, text_source
+    
+    images = pdf_to_images(pdf_path)
+    if engine == "Typhoon" and api_key:
+        text = ocr_typhoon(pdf_path, api_key, images=images)
+    else:
+        text = ocr_tesseract(pdf_path, images=images)
+    store_ocr_text(file_hash, cache_engine, text)
+    
+    entries, text = parse_ocr_text(text, master_path)
+    return entries, text, encode_page_images(images), "ocr"
+
+def process_pdfs_pipeline(pdf_paths, engine="Tesseract", api_key=None, master_path=None, workers=4, on_done=None, force_ocr=False):
+    """
+    OCR several PDFs through a three-stage pipeline:
+    1. a render thread rasterizes pages (or reads existing text: the text layer of
+       born-digital PDFs, or the OCR cache for files seen before)
+    2. `workers` OCR threads turn page images into text
+    3. the calling thread reassembles each file's pages in order and parses them
+    Tesseract and Poppler run as subprocesses, so the threads overlap real CPU work.
+    The queues are bounded so rendering never runs far ahead of OCR.
+    Each tesseract process is limited to one OpenMP thread (OMP_THREAD_LIMIT), so the
+    CPUs used are roughly `workers`.
+    
+    on_done(pdf_path, outcome) is called from the calling thread as each file finishes,
+    where outcome is the same tuple as process_single_pdf or the exception raised for that file.
+    """
+    use_typhoon = engine == "Typhoon" and api_key
+    headers = typhoon_headers(api_key) if use_typhoon else None
+    cache_engine = ocr_cache_engine(engine, api_key)
+    setup_tesseract()
+    
+    render_q = queue.Queue(maxsize=2 * workers)
+    ocr_q = queue.Queue(maxsize=2 * workers)
+    # Written by the render thread before a file's pages are queued, read when they're all OCR'd
+    file_hashes = {}
+    
+    def render_stage():
+        for pdf_path in pdf_paths:
+            try:
+                text, text_source, file_hashes[pdf_path] = find_existing_text(pdf_path, cache_engine, force_ocr)
+                if text is not None:
+                    ocr_q.put(("text", pdf_path, (text, text_source)))
+                    continue
+                
+                images = pdf_to_images(pdf_path)
+                if not images:
+                    raise ValueError("PDF has no pages")
+                for i, img in enumerate(images):
+                    render_q.put((pdf_path, i + 1, len(images), img))
+            except Exception as e:
+                ocr_q.put(("error", pdf_path, e))
+        
+        for _ in range(workers):
+            render_q.put(None)
+    
+    def ocr_stage():
+        while True:
+            item = render_q.get()
+            if item is None:
+                break
+            pdf_path, page_no, page_count, img = item
+            try:
+                if use_typhoon:
+                    section = ocr_typhoon_page(headers, page_no, img)
+                else:
+                    section = ocr_tesseract_page(page_no, img)
+                ocr_q.put(("page", pdf_path, (page_no, page_count, section, encode_page_image(img))))
+            except Exception as e:
+                ocr_q.put(("error", pdf_path, e))
+        ocr_q.put(("worker_done", None, None))
+    
+    def finish(pdf_path, outcome):
+        if on_done:
+            on_done(pdf_path, outcome)
+    
+    threads = [threading.Thread(target=render_stage, daemon=True)]
+    threads += [threading.Thread(target=ocr_stage, daemon=True) for _ in range(workers)]
+    for t in threads:
+        t.start()
+    
+    # Stage 3 (parse) runs here so on_done can safely touch the UI
+    pending_pages = {}
+    failed = set()
+    finished_workers = 0
+    
+    while finished_workers < workers:
+        kind, pdf_path, payload = ocr_q.get()
+        
+        if kind == "worker_done":
+            finished_workers += 1
+            continue
+        if pdf_path in failed:
+            continue
+        
+        if kind == "error":
+            failed.add(pdf_path)
+            pending_pages.pop(pdf_path, None)
+            finish(pdf_path, payload)
+        elif kind == "text":
+            text, text_source = payload
+            try:
+                entries, text = parse_ocr_text(text, master_path)
+                finish(pdf_path, (entries, text, {}, text_source))
+            except Exception as e:
+                finish(pdf_path, e)
+        else:
+            page_no, page_count, section, png_bytes = payload
+            pages = pending_pages.setdefault(pdf_path, {})
+            pages[page_no] = (section, png_bytes)
+            if len(pages) < page_count:
+                continue
+            
+            del pending_pages[pdf_path]
+            try:
+                text = "".join(pages[n][0] for n in range(1, page_count + 1))
+                store_ocr_text(file_hashes.get(pdf_path), cache_engine, text)
+                entries, text = parse_ocr_text(text, master_path)
+                finish(pdf_path, (entries, text, {n: pages[n][1] for n in pages}, "ocr"))
+            except Exception as e:
+                finish(pdf_path, e)
+    
+    for t in threads:
+        t.join()
+
+async def process_pdfs_typhoon_async(pdf_paths, api_key, master_path=None, max_concurrency=TYPHOON_MAX_CONCURRENCY, batch_size=TYPHOON_BATCH_SIZE, max_wait_ms=TYPHOON_BATCH_MAX_WAIT_MS, on_done=None, force_ocr=False):
+    """
+    OCR several PDFs through Typhoon over one shared HTTP session,
+    sending up to batch_size pages per request (pages from different files may share one;
+    a partial batch goes out after max_wait_ms).
+    on_done(pdf_path, outcome) is called as each file finishes, where outcome is
+    the same tuple as process_single_pdf or the exception raised for that file.
+    """
+    sem = asyncio.Semaphore(max_concurrency)
+    cache_engine = ocr_cache_engine("Typhoon", api_key)
+    
+    connector = aiohttp.TCPConnector(limit=max_concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        batcher = TyphoonBatcher(session, sem, typhoon_headers(api_key), batch_size, max_wait_ms)
+        
+        async def process_one(pdf_path):
+            try:
+                text, text_source, file_hash = await asyncio.to_thread(find_existing_text, pdf_path, cache_engine, force_ocr)
+                if text is not None:
+                    entries, text = parse_ocr_text(text, master_path)
+                    outcome = (entries, text, {}, text_source)
+                else:
+                    images = await asyncio.to_thread(pdf_to_images, pdf_path)
+                    text = await ocr_typhoon_async(pdf_path, api_key, session, sem, images=images, batcher=batcher)
+                    store_ocr_text(file_hash, cache_engine, text)
+                    entries, text = parse_ocr_text(text, master_path)
+                    page_images = await asyncio.to_thread(encode_page_images, images)
+                    outcome = (entries, text, page_images, "ocr")
+            except Exception as e:
+                outcome = e
+            if on_done:
+                on_done(pdf_path, outcome)
+            return outcome
+        
+        return await asyncio.gather(*[process_one(p) for p in pdf_paths])
+
 if __name__ == "__main__":
     import json
     base_dir = os.path.dirname(os.path.abspath(__file__))
@@ -367,7 +875,7 @@ if __name__ == "__main__":
     if os.path.exists(test_pdf):
         print(f"Testing OCR on: {test_pdf}")
         # Run with Tesseract as it's more stable for this test
-        results, raw_text = process_single_pdf(test_pdf, engine="Tesseract", master_path=master_file)
+        results, raw_text, _, _ = process_single_pdf(test_pdf, engine="Tesseract", master_path=master_file)
         print("Extracted Data:", json.dumps(results, indent=2))
         
         output_dir = os.path.join(base_dir, 'output', 'test_results')
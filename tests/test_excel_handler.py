@@ -0,0 +1,41 @@
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+
+from excel_handler import append_to_excel
+
+
+def _sheet_values(path):
+    ws = load_workbook(path).active
+    return [[cell.value for cell in row] for row in ws.iter_rows()]
+
+
+def test_append_keeps_blank_header_columns_in_place(tmp_path):
+    path = tmp_path / "export.xlsx"
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["A/C No", None, "Total Value"])
+    ws.append(["111", "note", 1.0])
+    wb.save(path)
+
+    append_to_excel(pd.DataFrame({"A/C No": ["222"], "Total Value": [9.0]}), str(path))
+
+    assert _sheet_values(path) == [
+        ["A/C No", None, "Total Value"],
+        ["111", "note", 1.0],
+        ["222", None, 9.0],
+    ]
+
+
+def test_append_adds_unknown_columns_after_last_used_column(tmp_path):
+    path = tmp_path / "export.xlsx"
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["A/C No", None, "Total Value"])
+    wb.save(path)
+
+    append_to_excel(pd.DataFrame({"A/C No": ["222"], "Currency": ["THB"]}), str(path))
+
+    assert _sheet_values(path) == [
+        ["A/C No", None, "Total Value", "Currency"],
+        ["222", None, None, "THB"],
+    ]